@@ -1,76 +1,271 @@
-from flask import Flask, render_template, request, jsonify, url_for, Response
+from flask import Flask, render_template, request, jsonify, Response
 import os
+import asyncio
 import json
+import hashlib
 import threading
-import time
-from functools import lru_cache
-from groq_app import build_graph, SummaryStateInput, Configuration
-import datetime
+import uuid
+from configuration import Configuration
+from providers import allowed_models, available_providers, model_name
+from cache_store import SqliteCache
+from scheduler import ResearchScheduler, AsyncResearchScheduler, QueueFullError
+from progress_events import ResearchEvents
+from run_registry import RunRegistry
 
 app = Flask(__name__)
- 
-research_cache = {}
-ongoing_research = {}
+
+research_cache = SqliteCache(
+    os.environ.get('RESEARCH_CACHE_PATH', os.path.join('cache', 'research.db')),
+    table='research_results',
+    max_bytes=int(os.environ.get('RESEARCH_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    ttl=int(os.environ.get('RESEARCH_CACHE_TTL', 86400)),
+)
+research_events = ResearchEvents()
+
+# Status and progress of recent runs stay in memory; finished runs refer to
+# their result in the research cache by its key
+research_runs = RunRegistry(
+    research_cache,
+    max_runs=int(os.environ.get('RESEARCH_RUNS_MAX', 1000)),
+    max_bytes=int(os.environ.get('RESEARCH_RUNS_MAX_BYTES', 64 * 1024 * 1024)),
+    ttl=float(os.environ.get('RESEARCH_RUN_TTL', 3600)),
+    size_of=research_events.size,
+    on_remove=research_events.discard,
+)
+
+# Maps a research cache key to the research_id of the run currently producing it,
+# so identical concurrent requests share one graph run instead of starting their own.
+inflight_research = {}
+inflight_lock = threading.Lock()
+
+# 'threads' runs each research on a worker thread; 'async' runs all of them as
+# tasks on one event loop through the graph's astream entry point
+async_execution = os.environ.get('RESEARCH_EXECUTION', 'threads') == 'async'
+
+def start_research(research_id):
+    """Mark a run as running the moment the scheduler takes it off the queue"""
+    research_runs.update(research_id, status='running', progress=0)
+    research_events.publish(research_id, {'type': 'started', 'progress': 0})
+
+if async_execution:
+    scheduler = AsyncResearchScheduler(
+        max_workers=int(os.environ.get('RESEARCH_WORKERS', 64)),
+        max_queue=int(os.environ.get('RESEARCH_QUEUE_SIZE', 256)),
+        on_start=start_research,
+    )
+else:
+    scheduler = ResearchScheduler(
+        max_workers=int(os.environ.get('RESEARCH_WORKERS', 4)),
+        max_queue=int(os.environ.get('RESEARCH_QUEUE_SIZE', 32)),
+        on_start=start_research,
+    )
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@lru_cache(maxsize=50)
-def cached_research(research_topic):
-    """Cache research results to avoid redundant processing""" 
-    graph = build_graph()
-     
+def research_config(llm_provider='groq', local_llm=None):
+    """Runnable config used for research runs started from the web app
+
+    Without local_llm, the provider's default model is used.
+    """
+    configurable = {
+        "max_web_research_loops": 3,
+        "llm_provider": llm_provider,
+    }
+    if local_llm:
+        configurable["local_llm"] = local_llm
+    return {"configurable": configurable}
+
+def prepare_research_graph():
+    """Import the pipeline, compile the web app's graph variant and optionally warm it up"""
+    from research_pipeline import get_graph, warmup_graph
+
+    config = research_config()
+    get_graph(config)
+    if os.environ.get('RESEARCH_WARMUP', '').lower() in ('1', 'true', 'yes'):
+        overhead = warmup_graph(config)
+        print(f"Research graph warmed up, pipeline overhead with stub backends: {overhead * 1000:.1f} ms")
+
+# The research pipeline (langgraph, langchain and langsmith) takes most of the startup
+# time, so it is kept off the import path of the server. 'background' loads it on a
+# thread while Flask already answers requests, 'eager' loads it before (use this with
+# gunicorn --preload, as threads do not survive the fork) and 'off' on the first research.
+research_preload = os.environ.get('RESEARCH_PRELOAD', 'background')
+if research_preload == 'eager':
+    prepare_research_graph()
+elif research_preload == 'background':
+    threading.Thread(target=prepare_research_graph, name='research-preload', daemon=True).start()
+
+def research_cache_key(research_topic, config):
+    """Cache key built from the normalized topic and the effective Configuration"""
+    configurable = Configuration.from_runnable_config(config)
+    key = {
+        "topic": " ".join(research_topic.lower().split()),
+        "max_web_research_loops": configurable.max_web_research_loops,
+        "queries_per_loop": configurable.queries_per_loop,
+        "source_token_budget": configurable.source_token_budget,
+        "summary_mode": configurable.summary_mode,
+        "novelty_threshold": configurable.novelty_threshold,
+        "query_similarity_threshold": configurable.query_similarity_threshold,
+        "llm_provider": configurable.llm_provider,
+        "local_llm": model_name(configurable),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+def traced_config(config, research_id):
+    """config with a span tracer recording the run under research_id, unless tracing is off"""
+    from tracing import trace_store
+
+    if research_id is None or trace_store is None:
+        return config
+    return dict(config, callbacks=[trace_store.tracer(research_id)])
+
+def run_research(research_topic, config, on_task=None, research_id=None):
+    """Run the research graph and keep only the output fields worth caching
+
+    on_task is called with every task start/result chunk of the graph's debug stream.
+    With a research_id the run's trace is recorded for /research/<id>/trace.
+    """
+    from research_pipeline import get_graph, SummaryStateInput
+
+    graph = get_graph(config)
+    config = traced_config(config, research_id)
+
+    research_input = SummaryStateInput(research_topic=research_topic)
+
+    result = {}
+    for mode, chunk in graph.stream(research_input, config=config, stream_mode=["debug", "values"]):
+        if mode == "values":
+            result = chunk
+        elif on_task is not None and chunk["type"] in ("task", "task_result"):
+            on_task(chunk)
+    return {'running_summary': result['running_summary'], 'research_stats': result.get('research_stats')}
+
+async def arun_research(research_topic, config, on_task=None, research_id=None):
+    """Async counterpart of run_research, driven by graph.astream"""
+    from research_pipeline import get_graph, SummaryStateInput
+
+    graph = get_graph(config)
+    config = traced_config(config, research_id)
+
     research_input = SummaryStateInput(research_topic=research_topic)
-    config = {"configurable": {"max_web_research_loops": 3}}   
-     
-    result = graph.invoke(research_input, config=config)
-    return result
 
-def perform_research(research_id, research_topic):
-    """Perform research in a separate thread"""
+    result = {}
+    async for mode, chunk in graph.astream(research_input, config=config, stream_mode=["debug", "values"]):
+        if mode == "values":
+            result = chunk
+        elif on_task is not None and chunk["type"] in ("task", "task_result"):
+            on_task(chunk)
+    return {'running_summary': result['running_summary'], 'research_stats': result.get('research_stats')}
+
+def _state_value(state, name):
+    if isinstance(state, dict):
+        return state.get(name)
+    return getattr(state, name, None)
+
+def node_progress_tracker(research_id, config):
+    """Return an on_task callback that turns graph tasks into progress events
+
+    A run executes generate_query, three nodes per research loop and finalize_summary,
+    which gives the total number of steps progress is measured against.
+    """
+    total_steps = 3 * Configuration.from_runnable_config(config).max_web_research_loops + 2
+    tracker = {'steps': 0, 'research_loop_count': 0}
+
+    def on_task(chunk):
+        payload = chunk['payload']
+        node = payload['name']
+
+        if chunk['type'] == 'task':
+            state = payload['input']
+            event = {
+                'type': 'node_started',
+                'node': node,
+                'research_loop_count': _state_value(state, 'research_loop_count') or 0,
+            }
+            if node == 'web_research':
+                event['query'] = _state_value(state, 'search_query')
+                event['queries'] = _state_value(state, 'search_queries') or [event['query']]
+        else:
+            update = dict(payload.get('result') or {})
+            tracker['steps'] += 1
+            tracker['research_loop_count'] = update.get('research_loop_count', tracker['research_loop_count'])
+            progress = min(99, int(100 * tracker['steps'] / total_steps))
+            research_runs.update(research_id, progress=progress)
+            event = {
+                'type': 'node_finished',
+                'node': node,
+                'research_loop_count': tracker['research_loop_count'],
+                'progress': progress,
+            }
+            if 'search_query' in update:
+                event['query'] = update['search_query']
+                event['queries'] = update.get('search_queries') or [update['search_query']]
+
+        research_events.publish(research_id, event)
+
+    return on_task
+
+def complete_research(research_id, result, cache_key):
+    research_runs.complete(research_id, cache_key)
+    # The summary stays in the research cache; clients fetch it from the status route
+    research_events.publish(research_id, {
+        'type': 'complete',
+        'stats': result.get('research_stats'),
+        'progress': 100
+    })
+
+def fail_research(research_id, error):
+    research_runs.fail(research_id, error)
+    research_events.publish(research_id, {
+        'type': 'error',
+        'error': error,
+        'progress': 100
+    })
+
+def perform_research(research_id, research_topic, config, cache_key):
+    """Perform research on a scheduler worker thread"""
     try: 
-        cache_key = research_topic.lower().strip()
+        result = research_cache.get(cache_key)
+        if result is not None:
+            complete_research(research_id, result, cache_key)
+            return
          
-        if cache_key in research_cache:
-            cache_time, result = research_cache[cache_key] 
-            if (datetime.datetime.now() - cache_time).total_seconds() < 86400:   
-                ongoing_research[research_id] = {
-                    'status': 'complete',
-                    'result': result,
-                    'progress': 100
-                }
-                return
-         
-        ongoing_research[research_id] = {'status': 'running', 'progress': 5}
-         
-        def update_progress():
-            progress = 5
-            while research_id in ongoing_research and ongoing_research[research_id]['status'] == 'running' and progress < 90:
-                time.sleep(2)
-                progress += 5
-                if research_id in ongoing_research:
-                    ongoing_research[research_id]['progress'] = progress
-         
-        progress_thread = threading.Thread(target=update_progress)
-        progress_thread.daemon = True
-        progress_thread.start()
-         
-        result = cached_research(research_topic)
-         
-        research_cache[cache_key] = (datetime.datetime.now(), result)
+        result = run_research(research_topic, config, on_task=node_progress_tracker(research_id, config),
+                              research_id=research_id)
+
+        research_cache.set(cache_key, result)
          
-        ongoing_research[research_id] = {
-            'status': 'complete',
-            'result': result,
-            'progress': 100
-        }
+        complete_research(research_id, result, cache_key)
     except Exception as e:
-        ongoing_research[research_id] = {
-            'status': 'error',
-            'error': str(e),
-            'progress': 100
-        }
+        fail_research(research_id, str(e))
+    finally:
+        release_inflight(research_id, cache_key)
+
+async def aperform_research(research_id, research_topic, config, cache_key):
+    """Perform research as a task on the async scheduler's event loop"""
+    try:
+        result = await asyncio.to_thread(research_cache.get, cache_key)
+        if result is not None:
+            await asyncio.to_thread(complete_research, research_id, result, cache_key)
+            return
+
+        result = await arun_research(research_topic, config, on_task=node_progress_tracker(research_id, config),
+                                     research_id=research_id)
+
+        await asyncio.to_thread(research_cache.set, cache_key, result)
+
+        await asyncio.to_thread(complete_research, research_id, result, cache_key)
+    except Exception as e:
+        fail_research(research_id, str(e))
+    finally:
+        release_inflight(research_id, cache_key)
+
+def release_inflight(research_id, cache_key):
+    with inflight_lock:
+        if inflight_research.get(cache_key) == research_id:
+            del inflight_research[cache_key]
 
 @app.route('/research', methods=['POST'])
 def research():
@@ -80,19 +275,75 @@ def research():
         
         if not research_topic:
             return jsonify({'error': 'Research topic is required'}), 400
+
+        llm_provider = data.get('llm_provider') or 'groq'
+        if llm_provider not in available_providers():
+            return jsonify({
+                'error': f"Unknown LLM provider, choose one of: {', '.join(available_providers())}"
+            }), 400
+
+        local_llm = data.get('local_llm')
+        if local_llm and local_llm not in allowed_models(llm_provider):
+            return jsonify({
+                'error': f"Model not allowed for {llm_provider}, choose one of: {', '.join(sorted(allowed_models(llm_provider)))}"
+            }), 400
          
-        research_id = f"research_{int(time.time())}_{hash(research_topic) % 10000}"
-         
-        research_thread = threading.Thread(
-            target=perform_research, 
-            args=(research_id, research_topic)
-        )
-        research_thread.daemon = True
-        research_thread.start()
-         
+        config = research_config(llm_provider, local_llm)
+        cache_key = research_cache_key(research_topic, config)
+
+        result = research_cache.get(cache_key)
+        if result is not None:
+            research_id = f"research_{uuid.uuid4().hex}"
+            complete_research(research_id, result, cache_key)
+            return jsonify({
+                'research_id': research_id,
+                'status': 'complete'
+            })
+
+        with inflight_lock:
+            research_id = inflight_research.get(cache_key)
+            if research_id is not None:
+                return jsonify({
+                    'research_id': research_id,
+                    'status': 'attached'
+                })
+
+            research_id = f"research_{uuid.uuid4().hex}"
+            try:
+                queue_position = scheduler.submit(
+                    research_id,
+                    aperform_research if async_execution else perform_research,
+                    research_id, research_topic, config, cache_key
+                )
+            except QueueFullError as e:
+                response = jsonify({
+                    'error': 'Too many research requests, please try again later',
+                    'retry_after': e.retry_after,
+                    'success': False
+                })
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response, 429
+
+            # Dispatched jobs are marked running by start_research, possibly already
+            if queue_position is None:
+                research_runs.create(research_id, status='running')
+            elif research_runs.create(research_id):
+                research_events.publish(research_id, {
+                    'type': 'queued',
+                    'queue_position': queue_position,
+                    'progress': 0
+                })
+            inflight_research[cache_key] = research_id
+
+        if queue_position is None:
+            return jsonify({
+                'research_id': research_id,
+                'status': 'running'
+            })
         return jsonify({
             'research_id': research_id,
-            'status': 'started'
+            'status': 'queued',
+            'queue_position': queue_position
         })
         
     except Exception as e:
@@ -103,17 +354,19 @@ def research():
 
 @app.route('/research/status/<research_id>', methods=['GET'])
 def research_status(research_id):
-    if research_id not in ongoing_research:
+    research_data = research_runs.get(research_id)
+    if research_data is None:
         return jsonify({'error': 'Research ID not found'}), 404
     
-    research_data = ongoing_research[research_id]
-    
     if research_data['status'] == 'complete': 
-        result = research_data['result'] 
+        result = research_runs.result(research_id)
+        if result is None:
+            return jsonify({'error': 'Research result expired'}), 410
 
         return jsonify({
             'status': 'complete',
             'summary': result['running_summary'],
+            'stats': result.get('research_stats'),
             'success': True,
             'progress': 100
         })
@@ -124,6 +377,13 @@ def research_status(research_id):
             'success': False,
             'progress': 100
         })
+    elif research_data['status'] == 'queued':
+        return jsonify({
+            'status': 'queued',
+            'queue_position': scheduler.position(research_id),
+            'progress': 0,
+            'success': True
+        })
     else: 
         return jsonify({
             'status': 'running',
@@ -131,12 +391,132 @@ def research_status(research_id):
             'success': True
         })
 
-@app.route('/research/stream')
-def stream():
+@app.route('/research/stream/<research_id>')
+def stream(research_id):
+    if research_id not in research_runs:
+        return jsonify({'error': 'Research ID not found'}), 404
+
+    # A reconnecting EventSource sends the id of the last event it received
+    try:
+        start = int(request.headers.get('Last-Event-ID', -1)) + 1
+    except ValueError:
+        # Not an id we sent, so replay the whole log
+        start = 0
+
     def generate():
-        yield "data: " + json.dumps({"message": "Connected"}) + "\n\n" 
-        
-    return Response(generate(), mimetype='text/event-stream')
+        for event in research_events.follow(research_id, start=start, alive=research_runs.__contains__):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {event['seq']}\ndata: {json.dumps(event)}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/research/<research_id>/trace', methods=['GET'])
+def research_trace(research_id):
+    """Span waterfall of a finished research run: graph, nodes, LLM calls and searches"""
+    from tracing import trace_store, waterfall
+
+    if trace_store is None:
+        return jsonify({'error': 'Tracing is disabled'}), 404
+
+    research_data = research_runs.get(research_id)
+    if research_data is not None and research_data['status'] in ('queued', 'running'):
+        return jsonify({'error': 'Research is still running', 'status': research_data['status']}), 409
+
+    # Only runs the registry still knows are looked up in the trace files, so
+    # unknown or made-up ids cannot make every request scan them
+    trace = trace_store.get(research_id, search_files=research_data is not None)
+    if trace is None:
+        return jsonify({'error': 'No trace for this research ID'}), 404
+
+    spans = waterfall(trace)
+    return jsonify({
+        'research_id': research_id,
+        'trace_id': trace['resourceSpans'][0]['scopeSpans'][0]['spans'][0]['traceId'] if spans else None,
+        'duration_ms': max((span['offset_ms'] + span['duration_ms'] for span in spans), default=0),
+        'spans': spans,
+    })
+
+@app.route('/diagnostics/caches')
+def cache_stats():
+    from research_pipeline import search_cache, source_store
+    from llm_cache import llm_cache
+
+    return jsonify({
+        'research': research_cache.stats(),
+        'search': search_cache.stats(),
+        'sources': source_store.stats(),
+        'llm': llm_cache.stats() if llm_cache is not None else None,
+    })
+
+@app.route('/diagnostics/runs')
+def run_stats():
+    return jsonify(research_runs.stats())
+
+@app.route('/diagnostics/retries')
+def retry_stats():
+    from retry import retry_metrics
+
+    return jsonify(retry_metrics.snapshot())
+
+@app.route('/diagnostics/hedging')
+def hedge_stats():
+    from hedging import hedge_stats
+
+    return jsonify(hedge_stats.snapshot())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Node, LLM, search, research run, cache, retry, hedging and circuit breaker metrics in Prometheus text format"""
+    import metrics
+    from research_pipeline import search_cache, source_store
+    from llm_cache import llm_cache
+    from retry import retry_metrics
+    from hedging import LATENCY_BUCKETS, hedge_stats
+    from circuit_breaker import breaker_states
+
+    stats = scheduler.stats()
+    queue = [
+        metrics.Family('research_workers', 'gauge', 'Research runs that can execute at once').add(stats['workers']),
+        metrics.Family('research_running', 'gauge', 'Research runs executing now').add(stats['running']),
+        metrics.Family('research_queued', 'gauge', 'Research requests waiting for a worker').add(stats['queued']),
+    ]
+    runs = research_runs.stats()
+    tracked = metrics.Family('research_runs', 'gauge', 'Research runs tracked in memory by status')
+    for status, count in runs['by_status'].items():
+        tracked.add(count, status=status)
+    queue += [
+        tracked,
+        metrics.Family('research_runs_bytes', 'gauge', 'Approximate bytes of the tracked runs and their event logs')
+            .add(runs['bytes']),
+        metrics.Family('research_runs_reaped_total', 'counter', 'Finished runs dropped after their TTL')
+            .add(runs['reaped']),
+        metrics.Family('research_runs_evicted_total', 'counter', 'Finished runs dropped early to stay within budget')
+            .add(runs['evicted']),
+    ]
+    families = (
+        queue
+        + metrics.cache_families({
+            'research': research_cache.stats(),
+            'search': search_cache.stats(),
+            'sources': source_store.stats(),
+            'llm': llm_cache.stats() if llm_cache is not None else None,
+        })
+        + metrics.retry_families(retry_metrics.snapshot())
+        + metrics.hedge_families(hedge_stats.snapshot(), LATENCY_BUCKETS)
+        + metrics.breaker_families(breaker_states())
+    )
+    return Response(metrics.render(families), mimetype='text/plain; version=0.0.4')
+
+@app.route('/diagnostics/breakers')
+def breaker_stats():
+    from circuit_breaker import breaker_states
+
+    return jsonify(breaker_states())
 
 if __name__ == '__main__':
     os.makedirs('templates', exist_ok=True)
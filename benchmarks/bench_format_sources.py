@@ -0,0 +1,151 @@
+"""Benchmark deduplicate_and_format_sources on large synthetic Tavily payloads.
+
+Compares the previous implementation (string += and a 4 characters per token cut)
+with the current one, and reports how far each lands from its token budget when
+measured with a real tokenizer.
+
+On CPython the previous implementation is not quadratic: += on a string nothing
+else references resizes it in place. The heuristic timings are therefore about
+equal; what the rewrite buys is the shared budget and, with a real tokenizer,
+staying within it. The tokenizer timings show what that accuracy costs.
+
+    python benchmarks/bench_format_sources.py --sources 50 --raw-chars 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from research_pipeline import deduplicate_and_format_sources
+from token_counting import TiktokenTokenizer
+
+WORDS = {
+    "english": "the research pipeline summarizes sources about education policy and funding".split(),
+    "cjk": list("研究管道总结了关于教育政策和资金的来源数据分析结果"),
+    "code": "def fn ( x ) : return { 'key' : [ 1 , 2 , 3 ] } ; // 0x1f".split(),
+}
+
+
+def legacy_deduplicate_and_format_sources(search_response, max_tokens_per_source, include_raw_content=True):
+    """The implementation before the token-budget rewrite, kept as the baseline."""
+    sources_list = search_response['results']
+    unique_sources = {}
+    for source in sources_list:
+        if source['url'] not in unique_sources:
+            unique_sources[source['url']] = source
+
+    formatted_text = "Sources:\n\n"
+    for i, source in enumerate(unique_sources.values(), 1):
+        formatted_text += f"Source {source['title']}:\n===\n"
+        formatted_text += f"URL: {source['url']}\n===\n"
+        formatted_text += f"Most relevant content from source: {source['content']}\n===\n"
+        if include_raw_content:
+            char_limit = max_tokens_per_source * 4
+            raw_content = source.get('raw_content', '') or ''
+            if len(raw_content) > char_limit:
+                raw_content = raw_content[:char_limit] + "... [truncated]"
+            formatted_text += f"Full source content limited to {max_tokens_per_source} tokens: {raw_content}\n\n"
+    return formatted_text.strip()
+
+
+def synthetic_payload(sources, raw_chars, language, seed=0):
+    rng = random.Random(seed)
+    words = WORDS[language]
+    separator = "" if language == "cjk" else " "
+    results = []
+    for i in range(sources):
+        # Mix short and long pages so the shared budget has something to redistribute
+        size = raw_chars if i % 2 else raw_chars // 20
+        text = separator.join(rng.choice(words) for _ in range(size // 4))[:size]
+        results.append({
+            "title": f"Source {i}",
+            "url": f"https://example.com/{i}",
+            "content": separator.join(rng.choice(words) for _ in range(40)),
+            "raw_content": text,
+        })
+    return {"results": results}
+
+
+def best_time(fn, repeat):
+    """Seconds per call, the best of repeat rounds of enough calls to take 0.2 s or more"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def budget_error(formatted, budget, reference):
+    """Relative difference between the real token count of the raw content and its budget."""
+    raw_parts = [
+        part.split(" tokens: ", 1)[1].replace("... [truncated]", "")
+        for part in formatted.split("Full source content limited to ")[1:]
+    ]
+    used = sum(reference.count(part) for part in raw_parts)
+    return round((used - budget) / budget * 100, 1), used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", type=int, default=50)
+    parser.add_argument("--raw-chars", type=int, default=200000)
+    parser.add_argument("--tokens-per-source", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    try:
+        reference = TiktokenTokenizer("cl100k_base")
+    except Exception as e:
+        print(f"Reference tokenizer unavailable, skipping token accuracy: {e}", file=sys.stderr)
+        reference = None
+
+    budget = args.sources * args.tokens_per_source
+    results = []
+    for language in WORDS:
+        payload = synthetic_payload(args.sources, args.raw_chars, language)
+        result = {
+            "language": language,
+            "sources": args.sources,
+            "raw_chars": args.raw_chars,
+            "legacy_seconds": best_time(
+                lambda: legacy_deduplicate_and_format_sources(payload, args.tokens_per_source), args.repeat),
+            "heuristic_seconds": best_time(
+                lambda: deduplicate_and_format_sources(payload, args.tokens_per_source), args.repeat),
+        }
+        if reference is not None:
+            result["tokenizer_seconds"] = best_time(
+                lambda: deduplicate_and_format_sources(payload, max_tokens=budget, tokenizer=reference), args.repeat)
+            legacy_error, legacy_used = budget_error(
+                legacy_deduplicate_and_format_sources(payload, args.tokens_per_source), budget, reference)
+            new_error, new_used = budget_error(
+                deduplicate_and_format_sources(payload, max_tokens=budget, tokenizer=reference), budget, reference)
+            result.update({
+                "token_budget": budget,
+                "legacy_tokens_used": legacy_used,
+                "legacy_budget_error_pct": legacy_error,
+                "tokenizer_tokens_used": new_used,
+                "tokenizer_budget_error_pct": new_error,
+            })
+        results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        print(f"[{result['language']}] legacy {result['legacy_seconds'] * 1000:.3f} ms, "
+              f"heuristic {result['heuristic_seconds'] * 1000:.3f} ms "
+              f"({result['legacy_seconds'] / result['heuristic_seconds']:.2f}x)", end="")
+        if "tokenizer_seconds" in result:
+            print(f", tokenizer {result['tokenizer_seconds'] * 1000:.2f} ms; "
+                  f"budget {result['token_budget']} tokens: legacy used {result['legacy_tokens_used']} "
+                  f"({result['legacy_budget_error_pct']:+}%), tokenizer used {result['tokenizer_tokens_used']} "
+                  f"({result['tokenizer_budget_error_pct']:+}%)")
+        else:
+            print()
+
+
+if __name__ == "__main__":
+    main()
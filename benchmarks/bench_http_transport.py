@@ -0,0 +1,87 @@
+"""Compare a fresh HTTP client per call with the shared pooled transport.
+
+Starts the local stub server and sends Tavily-shaped search requests from several
+threads, first opening a new client (and connection) for every call like the old
+per-call TavilyClient did, then through TavilySearchClient on the pooled transport.
+
+    python benchmarks/bench_http_transport.py --requests 500 --threads 8
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from search_client import TavilySearchClient
+from stub_server import start_stub_server
+
+
+def fresh_client_search(base_url, query):
+    with httpx.Client() as client:
+        response = client.post(f"{base_url}/search", json={"query": query, "max_results": 1})
+        response.raise_for_status()
+        return response.json()
+
+
+def run(name, call, requests, threads):
+    def timed(i):
+        start = time.perf_counter()
+        call(f"query {i}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "name": name,
+        "requests": requests,
+        "threads": threads,
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "latency_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub server latency in seconds")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    server = start_stub_server(latency=args.latency)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    pooled = TavilySearchClient(api_key="stub", base_url=base_url)
+
+    # Warm up both paths so the comparison excludes import and first-connection costs
+    fresh_client_search(base_url, "warmup")
+    pooled.search("warmup", max_results=1)
+
+    results = [
+        run("fresh_client_per_call", lambda q: fresh_client_search(base_url, q), args.requests, args.threads),
+        run("pooled_transport", lambda q: pooled.search(q, max_results=1), args.requests, args.threads),
+    ]
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'client':<24}{'req/s':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for result in results:
+        print(f"{result['name']:<24}{result['throughput_rps']:>10}{result['latency_mean_ms']:>10}"
+              f"{result['latency_p50_ms']:>10}{result['latency_p95_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""Run the research graph end to end against stub LLM and search backends.
+
+The stubs are injected through the graph's configurable backends, so no API key,
+network or paid call is needed. Their latency is drawn from a configurable
+distribution and their payload sizes are configurable, which makes it possible to
+compare configurations (queries_per_loop, summary_mode, source_token_budget, ...)
+on the same simulated workload. With zero latency the timings are the pipeline's
+own overhead. The suite also microbenchmarks the hot functions of the pipeline.
+
+    python benchmarks/bench_pipeline.py --runs 20 --llm-latency 0.05 --search-latency 0.1
+    python benchmarks/bench_pipeline.py --llm-latency 0 --search-latency 0 --json --output results.json
+    python benchmarks/bench_pipeline.py --mode async --concurrency 16 --set queries_per_loop=3
+
+The JSON results carry the git revision and library versions, so they can be
+compared across versions of the pipeline.
+"""
+import argparse
+import asyncio
+import atexit
+import contextlib
+import importlib.metadata
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep the benchmark away from the on-disk caches, which would turn repeated runs into lookups
+_cache_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+atexit.register(shutil.rmtree, _cache_dir, ignore_errors=True)
+os.environ.setdefault("SEARCH_CACHE_PATH", os.path.join(_cache_dir, "search.db"))
+os.environ.setdefault("LLM_CACHE", "0")
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from novelty import QueryHistory, shingle_novelty
+from research_pipeline import (
+    SummaryStateInput, build_graph, deduplicate_and_format_sources, format_source_refs, format_sources,
+    ref_shingles, source_shingles, store_sources,
+)
+from token_counting import HeuristicTokenizer
+from bench_format_sources import synthetic_payload
+
+WORDS = "research pipeline sources policy funding education analysis results data evidence".split()
+
+
+class Latency:
+    """Draws stub latencies in seconds from a fixed, exponential or lognormal distribution."""
+
+    def __init__(self, mean, distribution="lognormal", sigma=0.5, seed=0):
+        self.mean = mean
+        self.distribution = distribution
+        self.sigma = sigma
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        if self.mean <= 0:
+            return 0.0
+        with self._lock:
+            if self.distribution == "fixed":
+                return self.mean
+            if self.distribution == "exponential":
+                return self._rng.expovariate(1 / self.mean)
+            # Lognormal with the requested mean, the usual shape of API latencies
+            return self._rng.lognormvariate(math.log(self.mean) - self.sigma ** 2 / 2, self.sigma)
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model answering after a sampled latency, with summaries of summary_words words.
+
+    In JSON mode it answers with every query field the pipeline's prompts ask for, and
+    numbers the queries so the duplicate query filter does not end runs early.
+    """
+
+    latency: Latency
+    summary_words: int = 300
+    json_mode: bool = False
+    queries_per_loop: int = 1
+    _counter: itertools.count = PrivateAttr(default_factory=itertools.count)
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _content(self):
+        n = next(self._counter)
+        if not self.json_mode:
+            return " ".join(WORDS[(n + i) % len(WORDS)] for i in range(self.summary_words))
+        queries = [f"aspect{n}x{i} angle{n}x{i} topic" for i in range(self.queries_per_loop)]
+        return json.dumps({
+            "query": queries[0],
+            "queries": [{"query": query, "rationale": "stub"} for query in queries],
+            "follow_up_query": queries[0],
+            "follow_up_queries": queries,
+            "knowledge_gap": "stub",
+            "rationale": "stub",
+        })
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency.sample())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._content()))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency.sample())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._content()))])
+
+
+def stub_search_backends(latency, results_per_search, raw_chars):
+    """search and asearch stubs returning results_per_search distinct pages of raw_chars characters."""
+    def response(query, include_raw_content):
+        return {"results": [
+            {
+                "title": f"Result {i} for {query}",
+                "url": f"https://example.com/{abs(hash(query))}/{i}",
+                "content": f"Snippet {i} about {query}. " + " ".join(random.choices(WORDS, k=40)),
+                "raw_content": " ".join(random.choices(WORDS, k=raw_chars // 8))[:raw_chars] if include_raw_content else None,
+            }
+            for i in range(results_per_search)
+        ]}
+
+    def search(query, include_raw_content=True, max_results=3):
+        time.sleep(latency.sample())
+        return response(query, include_raw_content)
+
+    async def asearch(query, include_raw_content=True, max_results=3):
+        await asyncio.sleep(latency.sample())
+        return response(query, include_raw_content)
+
+    return search, asearch
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Collects the wall time of every graph node run, and its peak allocation when traced.
+
+    Allocation peaks are only meaningful for runs executed one at a time, since
+    tracemalloc measures the whole process.
+    """
+
+    run_inline = True
+
+    def __init__(self, trace_allocations=False):
+        self.trace_allocations = trace_allocations
+        self.timings = {}
+        self.allocations = {}
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        with self._lock:
+            # Nodes start a nested runnable of the same name; only time the outer one
+            if node is None or kwargs.get("name") != node or parent_run_id in self._started:
+                return
+            memory = 0
+            if self.trace_allocations:
+                memory = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            self._started[run_id] = (node, time.perf_counter(), memory)
+
+    def _finish(self, run_id):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is None:
+                return
+            node, start, memory = started
+            self.timings.setdefault(node, []).append(time.perf_counter() - start)
+            if self.trace_allocations:
+                self.allocations.setdefault(node, []).append(tracemalloc.get_traced_memory()[1] - memory)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+
+def distribution(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": statistics.mean(values),
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "max": values[-1],
+    }
+
+
+def graph_config(args, callbacks):
+    search, asearch = stub_search_backends(
+        Latency(args.search_latency, args.latency_distribution, args.latency_sigma, args.seed),
+        args.results_per_search, args.raw_chars)
+    llm_latency = Latency(args.llm_latency, args.latency_distribution, args.latency_sigma, args.seed + 1)
+    configurable = {
+        "max_web_research_loops": args.loops,
+        "novelty_threshold": 0.0,
+        **args.set,
+    }
+    queries = int(configurable.get("queries_per_loop", 1))
+    configurable.update({
+        "llm": StubChatModel(latency=llm_latency, summary_words=args.summary_words),
+        "llm_json_mode": StubChatModel(latency=llm_latency, json_mode=True, queries_per_loop=queries),
+        "search": search,
+        "asearch": asearch,
+    })
+    return {"configurable": configurable, "callbacks": callbacks}
+
+
+def run_graph(graph, args, mode, timer, topic):
+    config = graph_config(args, [timer])
+    research_input = SummaryStateInput(research_topic=topic)
+    start = time.perf_counter()
+    if mode == "async":
+        asyncio.run(graph.ainvoke(research_input, config=config))
+    else:
+        graph.invoke(research_input, config=config)
+    return time.perf_counter() - start
+
+
+def bench_graph(args):
+    graph = build_graph()
+    timer = NodeTimer()
+
+    # One untimed run initialises everything that is set up lazily
+    run_graph(graph, args, "sync", NodeTimer(), "warmup")
+
+    start = time.perf_counter()
+    if args.mode == "async":
+        async def run_all():
+            semaphore = asyncio.Semaphore(args.concurrency)
+            config = graph_config(args, [timer])
+
+            async def one(i):
+                async with semaphore:
+                    started = time.perf_counter()
+                    await graph.ainvoke(SummaryStateInput(research_topic=f"topic {i}"), config=config)
+                    return time.perf_counter() - started
+
+            return await asyncio.gather(*(one(i) for i in range(args.runs)))
+
+        run_seconds = asyncio.run(run_all())
+    else:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            run_seconds = list(executor.map(
+                lambda i: run_graph(graph, args, "sync", timer, f"topic {i}"), range(args.runs)))
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "mode": args.mode,
+        "runs": args.runs,
+        "concurrency": args.concurrency,
+        "elapsed_seconds": elapsed,
+        "throughput_runs_per_second": args.runs / elapsed,
+        "run_seconds": distribution(run_seconds),
+        "node_seconds": {node: distribution(values) for node, values in sorted(timer.timings.items())},
+    }
+
+    if args.allocations:
+        # A separate sequential run, since tracing slows everything down and is process wide
+        traced = NodeTimer(trace_allocations=True)
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            run_graph(graph, args, "sync", traced, "traced topic")
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        top = after.compare_to(before, "lineno")[:args.top_allocations]
+        result["allocations"] = {
+            "run_retained_bytes": sum(stat.size_diff for stat in after.compare_to(before, "filename")),
+            "node_peak_bytes": {node: max(values) for node, values in sorted(traced.allocations.items())},
+            "top_sites": [
+                {"site": str(stat.traceback), "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in top
+            ],
+        }
+    return result
+
+
+def best_time(fn, repeat, number):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+def bench_functions(args):
+    """Per-call time and throughput of the pipeline's hot helper functions."""
+    payload = synthetic_payload(args.results_per_search * 10, args.raw_chars, "english")
+    sources = payload["results"]
+    tokenizer = HeuristicTokenizer()
+    # The graph stores each loop's sources and formats and scores them through references
+    refs = store_sources(payload, 1, max_tokens_per_source=1000, tokenizer=tokenizer)
+    seen_urls = [ref["url"] for ref in refs[::2]]
+    known_refs = refs[::3]
+
+    def ref_shingles_uncached():
+        source_shingles.clear()
+        return [ref_shingles(ref, tokenizer) for ref in refs]
+
+    def novelty():
+        # As web_research_update scores a loop once its sources are shingled
+        return shingle_novelty(
+            {ref["url"]: ref_shingles(ref, tokenizer) for ref in refs},
+            seen_urls,
+            frozenset().union(*(ref_shingles(ref, tokenizer) for ref in known_refs)),
+        )
+
+    history = QueryHistory([f"aspect{i} angle{i} topic research" for i in range(200)])
+
+    cases = {
+        "deduplicate_and_format_sources": lambda: deduplicate_and_format_sources(payload, 1000),
+        "deduplicate_and_format_sources_budget": lambda: deduplicate_and_format_sources(
+            payload, max_tokens=len(sources) * 500),
+        "format_sources": lambda: format_sources(payload),
+        "store_sources": lambda: store_sources(payload, 1, max_tokens_per_source=1000, tokenizer=tokenizer),
+        "format_source_refs": lambda: format_source_refs(refs, tokenizer),
+        "ref_shingles_uncached": ref_shingles_uncached,
+        "shingle_novelty": novelty,
+        "query_history_find_duplicate": lambda: history.find_duplicate("aspect150 angle150 research topic"),
+    }
+    results = {}
+    for name, fn in cases.items():
+        seconds = best_time(fn, args.repeat, args.number)
+        results[name] = {"seconds_per_call": seconds, "calls_per_second": 1 / seconds if seconds else None}
+    return results
+
+
+def version_info():
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    versions = {}
+    for package in ("langgraph", "langchain-core"):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    return {"git_revision": revision, "python": platform.python_version(), **versions}
+
+
+def parse_setting(value):
+    name, _, raw = value.partition("=")
+    try:
+        return name, json.loads(raw)
+    except ValueError:
+        return name, raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync",
+                        help="Run the graph with invoke on threads or with ainvoke on one event loop")
+    parser.add_argument("--concurrency", type=int, default=1, help="Graph runs executing at once")
+    parser.add_argument("--loops", type=int, default=3, help="max_web_research_loops of every run")
+    parser.add_argument("--set", type=parse_setting, action="append", default=[], metavar="NAME=VALUE",
+                        help="Other configurable value of the runs, e.g. summary_mode=delta")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Mean LLM latency in seconds")
+    parser.add_argument("--search-latency", type=float, default=0.1, help="Mean search latency in seconds")
+    parser.add_argument("--latency-distribution", choices=("fixed", "exponential", "lognormal"), default="lognormal")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Sigma of the lognormal distribution")
+    parser.add_argument("--summary-words", type=int, default=300, help="Words in every stub summary")
+    parser.add_argument("--results-per-search", type=int, default=3)
+    parser.add_argument("--raw-chars", type=int, default=20000, help="Characters of raw content per search result")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-allocations", dest="allocations", action="store_false",
+                        help="Skip the traced run measuring allocations")
+    parser.add_argument("--top-allocations", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions of every function microbenchmark")
+    parser.add_argument("--number", type=int, default=20, help="Calls per microbenchmark repetition")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    args.set = dict(args.set)
+    random.seed(args.seed)
+
+    # The pipeline reports skipped queries and fallbacks with print, keep stdout for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        results = {
+            "version": version_info(),
+            "settings": {name: value for name, value in vars(args).items() if name not in ("json", "output")},
+            "graph": bench_graph(args),
+            "functions": bench_functions(args),
+        }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    graph = results["graph"]
+    print(f"{graph['runs']} {graph['mode']} runs at concurrency {graph['concurrency']}: "
+          f"{graph['throughput_runs_per_second']:.2f} runs/s, run p50 {graph['run_seconds']['p50'] * 1000:.1f} ms, "
+          f"p95 {graph['run_seconds']['p95'] * 1000:.1f} ms")
+    print("Per node (mean / p95 ms):")
+    for node, timing in graph["node_seconds"].items():
+        print(f"  {node:22} {timing['mean'] * 1000:9.2f} {timing['p95'] * 1000:9.2f}  x{timing['count']}")
+    if "allocations" in graph:
+        allocations = graph["allocations"]
+        print(f"Retained after a run: {allocations['run_retained_bytes'] / 1024:.0f} KiB, node peaks (KiB):")
+        for node, peak in allocations["node_peak_bytes"].items():
+            print(f"  {node:22} {peak / 1024:9.0f}")
+    print("Functions (us per call):")
+    for name, timing in results["functions"].items():
+        print(f"  {name:38} {timing['seconds_per_call'] * 1e6:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Measure the web app's cold start and fail when it exceeds a time budget.
+
+Each run starts a fresh interpreter that imports app and answers GET /, which is
+what an autoscaled host does before it can serve its first request. The report
+lists the slowest imports from python -X importtime, so a regression can be traced
+to the module that introduced it.
+
+    python benchmarks/bench_startup.py --runs 5 --budget 1.0
+
+Exits with status 1 when the median time to the first response is over --budget,
+so CI can run it as a startup regression check.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_RESPONSE = """
+import time
+start = time.perf_counter()
+import app
+response = app.app.test_client().get('/')
+assert response.status_code == 200, response.status_code
+print(time.perf_counter() - start)
+"""
+
+
+def startup_env(cache_dir):
+    env = dict(os.environ)
+    env.update({
+        # Measure the server's own startup path, not the background pipeline preload
+        "RESEARCH_PRELOAD": "off",
+        "RESEARCH_CACHE_PATH": os.path.join(cache_dir, "research.db"),
+        "SEARCH_CACHE_PATH": os.path.join(cache_dir, "search.db"),
+        "LLM_CACHE_PATH": os.path.join(cache_dir, "llm.db"),
+    })
+    return env
+
+
+def time_to_first_response(env):
+    output = subprocess.run(
+        [sys.executable, "-c", FIRST_RESPONSE], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def import_times(env, module="app"):
+    """Return (cumulative seconds, module) for every import made by importing module."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    ).stderr
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        times.append((int(cumulative_us) / 1e6, name))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+    parser.add_argument("--budget", type=float, default=None, help="Maximum median seconds to the first response")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = startup_env(cache_dir)
+        timings = [time_to_first_response(env) for _ in range(args.runs)]
+        times = import_times(env)
+
+    result = {
+        "runs": args.runs,
+        "first_response_median": statistics.median(timings),
+        "first_response_max": max(timings),
+        "budget": args.budget,
+        "slowest_imports": [
+            {"module": name, "cumulative_seconds": seconds}
+            for seconds, name in sorted(times, reverse=True)[:args.top]
+        ],
+    }
+    over_budget = args.budget is not None and result["first_response_median"] > args.budget
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"Time to first response: median {result['first_response_median'] * 1000:.0f} ms, "
+              f"max {result['first_response_max'] * 1000:.0f} ms over {args.runs} runs")
+        print("Slowest imports (cumulative):")
+        for entry in result["slowest_imports"]:
+            print(f"  {entry['cumulative_seconds'] * 1000:8.1f} ms  {entry['module']}")
+        if args.budget is not None:
+            print(f"Budget {args.budget * 1000:.0f} ms: {'EXCEEDED' if over_budget else 'ok'}")
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Local stub of the Tavily and OpenAI-compatible HTTP APIs used by the benchmarks.
+
+Run it standalone with ``python benchmarks/stub_server.py --port 8765`` or start it
+in-process with ``start_stub_server()``.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def search_response(query, max_results=3, raw_content_size=4000):
+    return {
+        "query": query,
+        "results": [
+            {
+                "title": f"Result {i} for {query}",
+                "url": f"https://example.com/{i}/{abs(hash(query))}",
+                "content": f"Snippet {i} about {query}.",
+                "raw_content": ("Lorem ipsum dolor sit amet. " * (raw_content_size // 28 + 1))[:raw_content_size],
+            }
+            for i in range(max_results)
+        ],
+    }
+
+
+def chat_completion_response(model, content):
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+    }
+
+
+def chat_completion_chunks(model, content):
+    """Split content into word-sized streaming chunks, ending with a finish_reason chunk."""
+    words = content.split(" ")
+    tokens = [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+    chunks = [{"role": "assistant", "content": ""}] + [{"content": token} for token in tokens]
+    for index, delta in enumerate(chunks + [{}]):
+        yield {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "delta": delta,
+                "finish_reason": "stop" if index == len(chunks) else None,
+            }],
+        }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    token_latency = 0.0
+    error_rate = 0.0
+    retry_after = 0.1
+    completion = "Stub completion."
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body, status=200):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_event_stream(self, events):
+        # Chunked transfer encoding keeps the connection reusable without knowing the length upfront
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event in events:
+            data = f"data: {event}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+            if self.token_latency:
+                time.sleep(self.token_latency)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.error_rate and random.random() < self.error_rate:
+            # Throttle like a rate-limited provider, telling the client when to come back
+            payload = json.dumps({"error": "Rate limit exceeded"}).encode("utf-8")
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.send_header("Retry-After", str(self.retry_after))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        if self.path.rstrip("/").endswith("/search"):
+            self._send_json(search_response(request.get("query", ""), request.get("max_results", 3)))
+        elif self.path.rstrip("/").endswith("/chat/completions"):
+            model = request.get("model", "stub")
+            if request.get("stream"):
+                chunks = (json.dumps(chunk) for chunk in chat_completion_chunks(model, self.completion))
+                self._send_event_stream(list(chunks) + ["[DONE]"])
+            else:
+                self._send_json(chat_completion_response(model, self.completion))
+        else:
+            self._send_json({"error": f"Unknown path {self.path}"}, status=404)
+
+
+def start_stub_server(port=0, latency=0.0, token_latency=0.0, error_rate=0.0, retry_after=0.1):
+    """Start the stub server on a daemon thread and return it; server.server_port has the port.
+
+    latency delays every response; token_latency additionally delays each chunk of a
+    streamed chat completion. error_rate is the share of requests answered with 429
+    and a Retry-After of retry_after seconds.
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency": latency,
+        "token_latency": token_latency,
+        "error_rate": error_rate,
+        "retry_after": retry_after,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between streamed completion chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds sent with a 429")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port, args.latency, args.token_latency, args.error_rate, args.retry_after)
+    print(f"Stub server listening on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,204 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Cache hits whose access time is written back in one transaction, or sooner once
+# TOUCH_INTERVAL seconds passed, so reads rarely take the database write lock
+TOUCH_BATCH = 256
+TOUCH_INTERVAL = 30
+# Eviction runs on a write once EVICT_INTERVAL seconds passed or EVICT_FRACTION of
+# max_bytes was written since the last one, instead of summing the table every time
+EVICT_INTERVAL = 30
+EVICT_FRACTION = 0.01
+
+
+class SqliteCache:
+    """A small on-disk key/value cache backed by SQLite in WAL mode.
+
+    Values are JSON-serialised and zlib-compressed. Entries expire after
+    ``ttl`` seconds and the least recently used entries are evicted once the
+    stored bytes exceed ``max_bytes``. Access times are written back in
+    batches and eviction runs periodically, so recency is approximate and the
+    cache can briefly exceed ``max_bytes`` by about 1%. Several processes (e.g.
+    gunicorn workers, also forked after the cache was created) can share the
+    same database file safely.
+
+    Args:
+        path (str): Location of the SQLite database file
+        table (str): Table name, so several caches can share one file
+        max_bytes (int): Upper bound on the compressed size of all values
+        ttl (float): Default time-to-live of an entry in seconds
+    """
+
+    def __init__(self, path, table="cache", max_bytes=256 * 1024 * 1024, ttl=86400):
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._touched = {}
+        self._touched_at = time.time()
+        self._written = 0
+        self._evicted_at = 0.0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Not kept, so a process forked after the cache was created opens its own
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, "
+                "value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at "
+                f"ON {self.table} (accessed_at)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        """Return the connection for the current thread and process, opening it if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # A connection inherited through fork() must not be used, nor closed,
+            # by the child; it stays referenced so it is never garbage collected
+            if conn is not None:
+                self._local.inherited = getattr(self._local, "inherited", []) + [conn]
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _touch(self, conn, key, now):
+        """Note the access of key and write back the batch of accesses once it is due."""
+        with self._lock:
+            self._touched[key] = now
+            if len(self._touched) < TOUCH_BATCH and now - self._touched_at < TOUCH_INTERVAL:
+                return
+            touched = self._take_touched(now)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_touched(conn, touched)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _take_touched(self, now):
+        # Callers hold self._lock
+        touched, self._touched = self._touched, {}
+        self._touched_at = now
+        return touched
+
+    def _write_touched(self, conn, touched):
+        conn.executemany(
+            f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in touched.items()],
+        )
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = row
+        if expires_at <= now:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+
+        self._touch(conn, key, now)
+        self.hits += 1
+        return json.loads(zlib.decompress(value))
+
+    def set(self, key, value, ttl=None):
+        """Store value under key and evict old entries if over the byte budget."""
+        conn = self._connect()
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        blob = zlib.compress(json.dumps(value).encode("utf-8"))
+
+        with self._lock:
+            # Pending accesses go out with the write, which takes the lock anyway
+            touched = self._take_touched(now)
+            self._written += len(blob)
+            evict = self._written > self.max_bytes * EVICT_FRACTION or now - self._evicted_at >= EVICT_INTERVAL
+            if evict:
+                self._written = 0
+                self._evicted_at = now
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_touched(conn, touched)
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} "
+                "(key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now + ttl, now),
+            )
+            if evict:
+                self._evict(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, key):
+        self._connect().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connect().execute(f"DELETE FROM {self.table}")
+
+    def _evict(self, conn, now):
+        """Drop expired entries, then least recently used ones until under budget."""
+        conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+
+        total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = conn.execute(
+            f"SELECT key, size FROM {self.table} ORDER BY accessed_at ASC"
+        ).fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", stale)
+
+    def stats(self):
+        """Return entry count, stored bytes and hit/miss counters for this process."""
+        count, size = self._connect().execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+        ).fetchone()
+        return {
+            "entries": count,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,224 @@
+import asyncio
+import collections
+import os
+import threading
+import time
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from providers import child_config
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when every provider of a failover chain is unavailable."""
+
+
+class CircuitBreaker:
+    """Stops calls to a provider whose recent calls mostly failed or were slow.
+
+    The breaker keeps the outcome of the last window calls. Once at least min_calls
+    are known and the share of failures, or of calls slower than slow_call_seconds,
+    reaches failure_rate, it opens and callers skip the provider. After open_seconds
+    it lets up to half_open_probes calls through. A fast successful probe closes it
+    again with a fresh window, a failed or slow one opens it for another open_seconds.
+
+    Args:
+        name (str): Provider the breaker guards
+        window (int): Number of recent calls the rates are computed over
+        min_calls (int): Calls needed in the window before the breaker can open
+        failure_rate (float): Share of failed or slow calls at which the breaker opens
+        slow_call_seconds (float): Latency above which a successful call counts as slow
+        open_seconds (float): Seconds the breaker stays open before probing
+        half_open_probes (int): Probe calls allowed at the same time while half open
+    """
+
+    def __init__(self, name, window=20, min_calls=5, failure_rate=0.5, slow_call_seconds=30.0,
+                 open_seconds=30.0, half_open_probes=1):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._outcomes = collections.deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._counters = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name):
+        return cls(
+            name,
+            window=int(os.environ.get("BREAKER_WINDOW", 20)),
+            min_calls=int(os.environ.get("BREAKER_MIN_CALLS", 5)),
+            failure_rate=float(os.environ.get("BREAKER_FAILURE_RATE", 0.5)),
+            slow_call_seconds=float(os.environ.get("BREAKER_SLOW_CALL_SECONDS", 30)),
+            open_seconds=float(os.environ.get("BREAKER_OPEN_SECONDS", 30)),
+            half_open_probes=int(os.environ.get("BREAKER_HALF_OPEN_PROBES", 1)),
+        )
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._counters["opened"] += 1
+        print(f"Circuit breaker for {self.name} opened")
+
+    def allow_request(self):
+        """Whether a call may go to the provider now; every allowed call must be recorded."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def record(self, latency, failed=False):
+        """Record the outcome of an allowed call and open or close the breaker accordingly."""
+        slow = not failed and latency > self.slow_call_seconds
+        with self._lock:
+            self._counters["calls"] += 1
+            self._counters["failures"] += failed
+            self._counters["slow_calls"] += slow
+
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed or slow:
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    print(f"Circuit breaker for {self.name} closed")
+                return
+
+            self._outcomes.append(failed or slow)
+            if (self._state == CLOSED and len(self._outcomes) >= self.min_calls
+                    and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate):
+                self._open()
+
+    def release(self):
+        """Give back the probe slot of an allowed call that was cancelled before it finished."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def snapshot(self):
+        with self._lock:
+            state = self._current_state()
+            snapshot = dict(self._counters, state=state)
+            snapshot["recent_failure_rate"] = (
+                round(sum(self._outcomes) / len(self._outcomes), 3) if self._outcomes else 0.0
+            )
+            if state == OPEN:
+                snapshot["retry_in"] = round(self.open_seconds - (time.monotonic() - self._opened_at), 1)
+            return snapshot
+
+
+breakers = {}
+breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Return the process-wide circuit breaker of provider name."""
+    with breakers_lock:
+        breaker = breakers.get(name)
+        if breaker is None:
+            breaker = breakers[name] = CircuitBreaker.from_env(name)
+        return breaker
+
+
+def breaker_states():
+    with breakers_lock:
+        current = dict(breakers)
+    return {name: breaker.snapshot() for name, breaker in current.items()}
+
+
+class FailoverChatModel(BaseChatModel):
+    """Chat model that calls the first provider of a chain whose circuit breaker is closed.
+
+    A call that fails moves on to the next provider, so a provider outage costs the
+    calls in flight one failed attempt each instead of the whole research run. The
+    outcome and latency of every call feed the provider's breaker; once it opens,
+    later calls go straight to the next provider until a probe finds it healthy.
+
+    Args:
+        providers (list[str]): Provider names in order of preference
+        models (list[BaseChatModel]): Chat model of each provider
+    """
+
+    providers: list[str]
+    models: list[BaseChatModel]
+
+    @property
+    def _llm_type(self) -> str:
+        return "failover"
+
+    @property
+    def _identifying_params(self):
+        return {"models": [model._get_llm_string() for model in self.models]}
+
+    def _no_provider_error(self, error):
+        if error is not None:
+            return error
+        return CircuitOpenError(f"Circuit breakers of {', '.join(self.providers)} are all open")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        error = None
+        config = child_config(run_manager)
+        for provider, model in zip(self.providers, self.models):
+            breaker = get_breaker(provider)
+            if not breaker.allow_request():
+                continue
+            started = time.monotonic()
+            try:
+                message = model.invoke(messages, config, stop=stop, **kwargs)
+            except Exception as e:
+                breaker.record(time.monotonic() - started, failed=True)
+                print(f"LLM call to {provider} failed, trying the next provider: {e}")
+                error = e
+                continue
+            breaker.record(time.monotonic() - started)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        raise self._no_provider_error(error)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        error = None
+        config = child_config(run_manager)
+        for provider, model in zip(self.providers, self.models):
+            breaker = get_breaker(provider)
+            if not breaker.allow_request():
+                continue
+            started = time.monotonic()
+            try:
+                message = await model.ainvoke(messages, config, stop=stop, **kwargs)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                breaker.record(time.monotonic() - started, failed=True)
+                print(f"LLM call to {provider} failed, trying the next provider: {e}")
+                error = e
+                continue
+            breaker.record(time.monotonic() - started)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        raise self._no_provider_error(error)
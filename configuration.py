@@ -1,9 +1,11 @@
 import os
 from enum import Enum
 from pydantic import BaseModel, Field
-from typing import Any, Optional, Literal
+from typing import TYPE_CHECKING, Any, Optional, Literal
 
-from langchain_core.runnables import RunnableConfig
+if TYPE_CHECKING:
+    # Only needed for annotations; importing langchain_core here would slow down startup
+    from langchain_core.runnables import RunnableConfig
 
 class SearchAPI(Enum):
     PERPLEXITY = "perplexity"
@@ -19,15 +21,65 @@ class Configuration(BaseModel):
         title="Research Depth",
         description="Number of research iterations to perform"
     )
-    local_llm: str = Field(
-        default="llama3.2",
+    queries_per_loop: int = Field(
+        default=1,
+        title="Queries per Loop",
+        description="Number of complementary search queries run concurrently in each research iteration"
+    )
+    source_token_budget: Optional[int] = Field(
+        default=None,
+        title="Source Token Budget",
+        description="Tokens of raw source content passed to the summarizer per research iteration, shared by all sources (default: 1000 per source)"
+    )
+    summary_mode: Literal["rewrite", "delta"] = Field(
+        default="rewrite",
+        title="Summary Mode",
+        description="rewrite regenerates the whole summary every iteration; delta only writes a section for the new findings"
+    )
+    summary_compaction_tokens: int = Field(
+        default=3000,
+        title="Summary Compaction Threshold",
+        description="In delta mode, merge the summary sections into one once they exceed this many tokens"
+    )
+    novelty_threshold: float = Field(
+        default=0.0,
+        title="Novelty Threshold",
+        description="Stop researching early once a loop's search results score below this novelty (0 to 1, 0 disables)"
+    )
+    query_similarity_threshold: float = Field(
+        default=0.7,
+        title="Query Similarity Threshold",
+        description="Jaccard similarity of their terms at or above which a follow-up query counts as a repeat of an earlier search"
+    )
+    local_llm: Optional[str] = Field(
+        default=None,
         title="LLM Model Name",
-        description="Name of the LLM model to use"
+        description="Name of the LLM model to use (default: the provider's default model)"
     )
-    llm_provider: Literal["ollama", "lmstudio"] = Field(
+    llm_provider: Literal["ollama", "lmstudio", "groq", "gemini", "nebius"] = Field(
         default="ollama",
         title="LLM Provider",
-        description="Provider for the LLM (Ollama or LMStudio)"
+        description="Provider for the LLM (Ollama, LMStudio, Groq, Gemini or Nebius)"
+    )
+    fallback_providers: Optional[str] = Field(
+        default=None,
+        title="Fallback Providers",
+        description="Comma-separated providers, optionally as provider:model, that take over LLM calls in this order when llm_provider fails or its circuit breaker is open, e.g. nebius,ollama (default: no failover)"
+    )
+    hedge_provider: Optional[Literal["ollama", "lmstudio", "groq", "gemini", "nebius"]] = Field(
+        default=None,
+        title="Hedge Provider",
+        description="Provider a slow LLM call is also sent to, taking whichever answers first (default: no hedging)"
+    )
+    hedge_model: Optional[str] = Field(
+        default=None,
+        title="Hedge Model Name",
+        description="Model of the hedge provider (default: the hedge provider's default model)"
+    )
+    hedge_percentile: float = Field(
+        default=0.95,
+        title="Hedge Percentile",
+        description="Percentile of the primary provider's recent latency after which a call is hedged"
     )
     search_api: Literal["perplexity", "tavily", "duckduckgo", "searxng"] = Field(
         default="duckduckgo",
@@ -57,7 +109,7 @@ class Configuration(BaseModel):
 
     @classmethod
     def from_runnable_config(
-        cls, config: Optional[RunnableConfig] = None
+        cls, config: Optional["RunnableConfig"] = None
     ) -> "Configuration":
         """Create a Configuration instance from a RunnableConfig."""
         configurable = (
@@ -0,0 +1,219 @@
+import asyncio
+import bisect
+import collections
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from providers import child_config
+
+# Upper bounds in seconds of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Runs the primary and secondary calls of synchronous hedged requests
+hedge_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("HEDGE_WORKERS", 32)),
+    thread_name_prefix="hedge",
+)
+
+
+class LatencyWindow:
+    """The most recent latencies of one model and node, for percentile estimates."""
+
+    def __init__(self, size=200):
+        self._samples = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+class HedgeStats:
+    """Per-node counters and latency histograms of hedged LLM calls."""
+
+    def __init__(self):
+        self._nodes = {}
+        self._lock = threading.Lock()
+
+    def _node(self, node):
+        return self._nodes.setdefault(node, {
+            "calls": 0,
+            "hedged": 0,
+            "secondary_wins": 0,
+            "failures": 0,
+            "latency_sum": 0.0,
+            "latency_buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+        })
+
+    def record(self, node, latency, hedged, winner):
+        with self._lock:
+            stats = self._node(node)
+            stats["calls"] += 1
+            stats["hedged"] += hedged
+            stats["secondary_wins"] += winner == "secondary"
+            stats["latency_sum"] += latency
+            stats["latency_buckets"][bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def record_failure(self, node):
+        with self._lock:
+            stats = self._node(node)
+            stats["calls"] += 1
+            stats["failures"] += 1
+
+    def snapshot(self):
+        """Counters per node, with hedge_rate and the histogram keyed by bucket bound."""
+        with self._lock:
+            nodes = {node: dict(stats, latency_buckets=list(stats["latency_buckets"])) for node, stats in self._nodes.items()}
+        for stats in nodes.values():
+            stats["hedge_rate"] = round(stats["hedged"] / stats["calls"], 3) if stats["calls"] else 0.0
+            bounds = [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+            stats["latency_buckets"] = dict(zip(bounds, stats["latency_buckets"]))
+        return nodes
+
+
+hedge_stats = HedgeStats()
+
+
+def _node_name(run_manager):
+    # LangGraph puts the name of the calling node into the run metadata
+    metadata = getattr(run_manager, "metadata", None) or {}
+    return metadata.get("langgraph_node", "unknown")
+
+
+def _chat_result(message):
+    return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class HedgedChatModel(BaseChatModel):
+    """Chat model that sends a slow request to a second model as well and takes the first answer.
+
+    Once the primary model has taken longer than the given percentile of its recent
+    latency for the same graph node, the same messages go to the secondary model.
+    Whichever answers first wins and the other call is cancelled. Async calls are
+    cancelled outright; a synchronous call that is already running finishes in the
+    background and its answer is discarded. A primary that fails before the hedge
+    delay hands over to the secondary right away.
+
+    Args:
+        primary (BaseChatModel): Model every request goes to first
+        secondary (BaseChatModel): Model slow or failed requests are hedged to
+        percentile (float): Share of recent primary latencies to wait for before hedging
+        initial_delay (float): Hedge delay in seconds until min_samples latencies are known
+        min_delay (float): Lower bound of the hedge delay in seconds
+        min_samples (int): Latencies needed before the percentile is used
+    """
+
+    primary: BaseChatModel
+    secondary: BaseChatModel
+    percentile: float = 0.95
+    initial_delay: float = 10.0
+    min_delay: float = 0.25
+    min_samples: int = 20
+    _windows: dict = PrivateAttr(default_factory=dict)
+    _windows_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    @property
+    def _identifying_params(self):
+        return {
+            "primary": self.primary._get_llm_string(),
+            "secondary": self.secondary._get_llm_string(),
+        }
+
+    def _window(self, node):
+        with self._windows_lock:
+            return self._windows.setdefault(node, LatencyWindow())
+
+    def hedge_delay(self, node):
+        """Seconds to wait for the primary model before hedging a call from node."""
+        window = self._window(node)
+        if len(window) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, window.percentile(self.percentile))
+
+    def _record_primary(self, node, started, cancelled, failed):
+        # Failed calls say nothing about normal latency. A cancelled call took at least
+        # this long, and counting it keeps slow periods from pulling the percentile down.
+        if not failed or cancelled:
+            self._window(node).add(time.monotonic() - started)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        node = _node_name(run_manager)
+        delay = self.hedge_delay(node)
+        config = child_config(run_manager)
+        started = time.monotonic()
+
+        primary = hedge_executor.submit(self.primary.invoke, messages, config, stop=stop, **kwargs)
+        primary.add_done_callback(lambda future: self._record_primary(
+            node, started, future.cancelled(), not future.cancelled() and future.exception() is not None))
+        calls = {primary: "primary"}
+
+        done, _ = wait([primary], timeout=delay)
+        if not done or primary.exception() is not None:
+            calls[hedge_executor.submit(self.secondary.invoke, messages, config, stop=stop, **kwargs)] = "secondary"
+
+        pending = set(calls)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    hedge_stats.record(node, time.monotonic() - started, len(calls) > 1, calls[future])
+                    return _chat_result(future.result())
+                error = future.exception()
+        hedge_stats.record_failure(node)
+        raise error
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        node = _node_name(run_manager)
+        delay = self.hedge_delay(node)
+        config = child_config(run_manager)
+        started = time.monotonic()
+
+        primary = asyncio.ensure_future(self.primary.ainvoke(messages, config, stop=stop, **kwargs))
+        primary.add_done_callback(lambda task: self._record_primary(
+            node, started, task.cancelled(), not task.cancelled() and task.exception() is not None))
+        calls = {primary: "primary"}
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done or primary.exception() is not None:
+                calls[asyncio.ensure_future(self.secondary.ainvoke(messages, config, stop=stop, **kwargs))] = "secondary"
+
+            pending = set(calls)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        hedge_stats.record(node, time.monotonic() - started, len(calls) > 1, calls[task])
+                        return _chat_result(task.result())
+                    error = task.exception()
+            hedge_stats.record_failure(node)
+            raise error
+        finally:
+            # Cancels the losing call, and both calls if this one was cancelled
+            for task in calls:
+                if not task.done():
+                    task.cancel()
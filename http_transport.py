@@ -0,0 +1,173 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+
+# Connection pool settings shared by every outbound HTTP client (search and LLM providers)
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 100))
+HTTP_POOL_PER_HOST = int(os.environ.get("HTTP_POOL_PER_HOST", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", 30))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 120))
+
+http_client = None
+async_http_clients = weakref.WeakKeyDictionary()
+http_clients_lock = threading.Lock()
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body stream that frees its per-host slot once the body is closed."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+def _release_once(semaphore):
+    released = threading.Event()
+
+    def release():
+        if not released.is_set():
+            released.set()
+            semaphore.release()
+
+    return release
+
+
+class HostLimitedTransport(httpx.BaseTransport):
+    """Wraps a pooled transport and caps concurrent connections per host.
+
+    httpx only limits connections per pool, so a slow provider could otherwise take
+    every connection and starve requests to the other hosts.
+    """
+
+    def __init__(self, transport, max_per_host):
+        self._transport = transport
+        self._max_per_host = max_per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, url):
+        key = (url.scheme, url.host, url.port)
+        with self._lock:
+            if key not in self._semaphores:
+                self._semaphores[key] = threading.BoundedSemaphore(self._max_per_host)
+            return self._semaphores[key]
+
+    def handle_request(self, request):
+        semaphore = self._semaphore(request.url)
+        semaphore.acquire()
+        release = _release_once(semaphore)
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncHostLimitedTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of HostLimitedTransport, bound to a single event loop."""
+
+    def __init__(self, transport, max_per_host):
+        self._transport = transport
+        self._max_per_host = max_per_host
+        self._semaphores = {}
+
+    def _semaphore(self, url):
+        key = (url.scheme, url.host, url.port)
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.BoundedSemaphore(self._max_per_host)
+        return self._semaphores[key]
+
+    async def handle_async_request(self, request):
+        semaphore = self._semaphore(request.url)
+        await semaphore.acquire()
+        release = _release_once(semaphore)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_AsyncReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=HTTP_POOL_SIZE,
+        max_keepalive_connections=HTTP_POOL_SIZE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_http_client():
+    """Return the process-wide pooled httpx.Client.
+
+    The client is thread-safe and keeps connections (and their TLS sessions) alive
+    between calls. Callers must pass credentials per request rather than setting
+    them on the client, since the client is shared across providers.
+    """
+    global http_client
+    with http_clients_lock:
+        if http_client is None:
+            transport = HostLimitedTransport(httpx.HTTPTransport(limits=_limits()), HTTP_POOL_PER_HOST)
+            http_client = httpx.Client(transport=transport, timeout=HTTP_TIMEOUT)
+        return http_client
+
+
+def get_async_http_client():
+    """Return the pooled httpx.AsyncClient of the running event loop.
+
+    Async connection pools are bound to the loop that created them, so there is
+    one shared client per loop.
+    """
+    loop = asyncio.get_running_loop()
+    with http_clients_lock:
+        client = async_http_clients.get(loop)
+        if client is None:
+            transport = AsyncHostLimitedTransport(httpx.AsyncHTTPTransport(limits=_limits()), HTTP_POOL_PER_HOST)
+            client = httpx.AsyncClient(transport=transport, timeout=HTTP_TIMEOUT)
+            async_http_clients[loop] = client
+        return client
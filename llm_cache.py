@@ -0,0 +1,85 @@
+import hashlib
+import os
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+from cache_store import SqliteCache
+
+
+def dump_generation(generation):
+    if isinstance(generation, ChatGeneration):
+        return {"message": message_to_dict(generation.message), "generation_info": generation.generation_info}
+    return {"text": generation.text, "generation_info": generation.generation_info}
+
+
+def load_generation(data):
+    if "message" in data:
+        message = messages_from_dict([data["message"]])[0]
+        return ChatGeneration(message=message, generation_info=data["generation_info"])
+    return Generation(text=data["text"], generation_info=data["generation_info"])
+
+
+class SqliteLLMCache(BaseCache):
+    """LangChain LLM cache that keeps chat model responses in a SqliteCache.
+
+    Entries are keyed by a hash of the serialised messages and the model's llm_string,
+    which holds the provider, model name and sampling parameters, so a response is
+    only reused for the exact same request to the same model. Pass the cache to a
+    chat model with cache=llm_cache.
+
+    A failing cache never fails the LLM call; lookups then count as misses.
+
+    Args:
+        store (SqliteCache): Backing store that handles expiry, eviction and hit/miss counters
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def _key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        try:
+            cached = self.store.get(self._key(prompt, llm_string))
+        except Exception as e:
+            print(f"Warning: LLM cache lookup failed: {e}")
+            return None
+        if cached is None:
+            return None
+        generations = [load_generation(generation) for generation in cached]
+        for generation in generations:
+            # Tells the metrics callback that no provider was called
+            generation.generation_info = {**(generation.generation_info or {}), "llm_cache_hit": True}
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        try:
+            self.store.set(self._key(prompt, llm_string), [dump_generation(generation) for generation in return_val])
+        except Exception as e:
+            print(f"Warning: LLM cache update failed: {e}")
+
+    def clear(self, **kwargs):
+        self.store.clear()
+
+    def stats(self):
+        return self.store.stats()
+
+
+def create_llm_cache():
+    """Build the LLM cache from the LLM_CACHE_* environment variables, or None if disabled."""
+    if os.environ.get("LLM_CACHE", "1").lower() in ("0", "false", "no"):
+        return None
+    return SqliteLLMCache(SqliteCache(
+        os.environ.get("LLM_CACHE_PATH", os.path.join("cache", "llm.db")),
+        table="llm_responses",
+        max_bytes=int(os.environ.get("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+        ttl=int(os.environ.get("LLM_CACHE_TTL", 7 * 86400)),
+    ))
+
+
+# Shared by the llm and llm_json_mode clients of every pipeline
+llm_cache = create_llm_cache()
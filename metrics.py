@@ -0,0 +1,299 @@
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Upper bounds of the duration histograms in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Upper bounds of the payload size histograms in bytes
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Chat models that only wrap other chat models; their inner calls are recorded instead
+WRAPPER_MODEL_TYPES = frozenset({"hedged", "failover"})
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter per label combination."""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations per label combination."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            yield from histogram_samples(self.name, list(zip(self.labelnames, key)), self.buckets, counts, total)
+
+
+def histogram_samples(name, labels, bounds, counts, total):
+    """Prometheus samples of a histogram from per-bucket counts, the last one unbounded."""
+    cumulative = 0
+    for bound, count in zip(list(bounds) + [float("inf")], counts):
+        cumulative += count
+        yield f"{name}_bucket", labels + [("le", _format_value(bound))], cumulative
+    yield f"{name}_sum", labels, total
+    yield f"{name}_count", labels, cumulative
+
+
+class Family:
+    """Samples computed at scrape time from stats kept elsewhere, e.g. cache counters."""
+
+    def __init__(self, name, type, documentation):
+        self.name = name
+        self.type = type
+        self.documentation = documentation
+        self._samples = []
+
+    def add(self, value, **labels):
+        self._samples.append((self.name, sorted(labels.items()), value))
+        return self
+
+    def extend(self, samples):
+        self._samples.extend(samples)
+
+    def samples(self):
+        return iter(self._samples)
+
+
+node_duration = Histogram(
+    "research_node_duration_seconds", "Duration of research graph node runs",
+    ("node", "provider", "model"))
+node_errors = Counter(
+    "research_node_errors_total", "Research graph node runs that raised",
+    ("node", "provider", "model"))
+llm_duration = Histogram(
+    "llm_request_duration_seconds", "Duration of LLM calls",
+    ("node", "provider", "model"))
+llm_requests = Counter(
+    "llm_requests_total", "LLM calls by outcome",
+    ("node", "provider", "model", "status"))
+llm_cache_hits = Counter(
+    "llm_cache_hits_total", "LLM calls answered from the LLM cache, which the other llm_ series leave out",
+    ("node", "provider", "model"))
+llm_prompt_tokens = Counter(
+    "llm_prompt_tokens_total", "Prompt tokens reported by the LLM provider",
+    ("node", "provider", "model"))
+llm_completion_tokens = Counter(
+    "llm_completion_tokens_total", "Completion tokens reported by the LLM provider",
+    ("node", "provider", "model"))
+search_duration = Histogram(
+    "search_request_duration_seconds", "Duration of web searches including cache lookups",
+    ("provider", "cache"))
+search_requests = Counter(
+    "search_requests_total", "Web searches by outcome: ok, error or cached",
+    ("provider", "status"))
+search_raw_content_bytes = Histogram(
+    "search_raw_content_bytes", "Raw page content bytes returned by a web search",
+    ("provider",), buckets=BYTES_BUCKETS)
+json_parse_fallbacks = Counter(
+    "llm_json_parse_fallbacks_total", "LLM answers that were not the expected JSON and fell back to a default query",
+    ("node", "provider", "model"))
+
+registry = [
+    node_duration, node_errors, llm_duration, llm_requests, llm_cache_hits, llm_prompt_tokens, llm_completion_tokens,
+    search_duration, search_requests, search_raw_content_bytes, json_parse_fallbacks,
+]
+
+
+def raw_content_bytes(search_response):
+    return sum(len((result.get("raw_content") or "").encode("utf-8")) for result in search_response.get("results", []))
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Records duration, outcome and token usage of every chat model call it sees.
+
+    Labels come from the model's LangSmith parameters and the graph node in the run
+    metadata, so calls made through a wrapper such as HedgedChatModel are counted
+    under the provider that actually answered.
+    """
+
+    run_inline = True
+    ignore_chain = True
+    ignore_agent = True
+    ignore_retriever = True
+    ignore_retry = True
+
+    def __init__(self):
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, invocation_params=None, **kwargs):
+        metadata = metadata or {}
+        invocation_params = invocation_params or {}
+        model_type = invocation_params.get("_type")
+        if model_type in WRAPPER_MODEL_TYPES:
+            return
+        labels = {
+            "node": metadata.get("langgraph_node", ""),
+            "provider": metadata.get("ls_provider") or model_type or "",
+            "model": (metadata.get("ls_model_name") or invocation_params.get("model")
+                      or invocation_params.get("model_name") or ""),
+        }
+        with self._lock:
+            self._runs[run_id] = (labels, time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            started = self._runs.pop(run_id, None)
+        if started is None:
+            return
+        labels, start = started
+        generations = response.generations[0] if response.generations else []
+        # SqliteLLMCache.lookup marks the generations it answers with; the provider
+        # was not called, so the call stays out of the latency, request and token series
+        if generations and (generations[0].generation_info or {}).get("llm_cache_hit"):
+            llm_cache_hits.inc(**labels)
+            return
+        llm_duration.observe(time.perf_counter() - start, **labels)
+        llm_requests.inc(status="ok", **labels)
+
+        usage = None
+        message = getattr(generations[0], "message", None) if generations else None
+        if message is not None and getattr(message, "usage_metadata", None):
+            usage = message.usage_metadata
+            prompt, completion = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        elif response.llm_output and response.llm_output.get("token_usage"):
+            usage = response.llm_output["token_usage"]
+            prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        if usage:
+            llm_prompt_tokens.inc(prompt or 0, **labels)
+            llm_completion_tokens.inc(completion or 0, **labels)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            started = self._runs.pop(run_id, None)
+        if started is None:
+            return
+        labels, start = started
+        llm_duration.observe(time.perf_counter() - start, **labels)
+        # A hedged call cancelled because the other provider answered first did not fail
+        status = "cancelled" if type(error).__name__ == "CancelledError" else "error"
+        llm_requests.inc(status=status, **labels)
+
+
+metrics_callback = MetricsCallbackHandler()
+
+
+def cache_families(caches):
+    """Families for the stats() of SqliteCache-like caches, keyed by cache name."""
+    hits = Family("cache_hits_total", "counter", "Cache lookups answered from the cache by this process")
+    misses = Family("cache_misses_total", "counter", "Cache lookups that missed in this process")
+    entries = Family("cache_entries", "gauge", "Entries stored in the cache")
+    size = Family("cache_size_bytes", "gauge", "Bytes stored in the cache")
+    for name, stats in caches.items():
+        if stats is None:
+            continue
+        hits.add(stats["hits"], cache=name)
+        misses.add(stats["misses"], cache=name)
+        entries.add(stats["entries"], cache=name)
+        size.add(stats["bytes"], cache=name)
+    return [hits, misses, entries, size]
+
+
+def retry_families(snapshot):
+    families = {
+        field: Family(f"retry_{field}_total", "counter", f"Retry layer {field.replace('_', ' ')} per client")
+        for field in ("calls", "retries", "rate_limited", "failures", "deadline_exceeded", "wait_seconds")
+    }
+    for name, counters in snapshot.items():
+        for field, family in families.items():
+            family.add(counters.get(field, 0), client=name)
+    return list(families.values())
+
+
+def hedge_families(snapshot, bounds):
+    calls = Family("llm_hedge_calls_total", "counter", "Calls through a hedged chat model")
+    hedged = Family("llm_hedged_total", "counter", "Calls that were sent to the hedge provider as well")
+    wins = Family("llm_hedge_secondary_wins_total", "counter", "Hedged calls answered first by the hedge provider")
+    failures = Family("llm_hedge_failures_total", "counter", "Hedged calls where every provider failed")
+    latency = Family("llm_hedged_duration_seconds", "histogram", "Duration of calls through a hedged chat model")
+    for node, stats in snapshot.items():
+        calls.add(stats["calls"], node=node)
+        hedged.add(stats["hedged"], node=node)
+        wins.add(stats["secondary_wins"], node=node)
+        failures.add(stats["failures"], node=node)
+        latency.extend(histogram_samples(
+            latency.name, [("node", node)], bounds, list(stats["latency_buckets"].values()), stats["latency_sum"]))
+    return [calls, hedged, wins, failures, latency]
+
+
+def breaker_families(states):
+    state = Family("circuit_breaker_state", "gauge", "Circuit breaker state: 0 closed, 1 half open, 2 open")
+    opened = Family("circuit_breaker_opened_total", "counter", "Times the circuit breaker opened")
+    rejected = Family("circuit_breaker_rejected_total", "counter", "Calls skipped because the circuit breaker was open")
+    values = {"closed": 0, "half_open": 1, "open": 2}
+    for provider, snapshot in states.items():
+        state.add(values[snapshot["state"]], provider=provider)
+        opened.add(snapshot["opened"], provider=provider)
+        rejected.add(snapshot["rejected"], provider=provider)
+    return [state, opened, rejected]
+
+
+def render(families=()):
+    """Prometheus text exposition of the registry and the given scrape-time families."""
+    lines = []
+    for family in list(registry) + list(families):
+        lines.append(f"# HELP {family.name} {family.documentation}")
+        lines.append(f"# TYPE {family.name} {family.type}")
+        for name, labels, value in family.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
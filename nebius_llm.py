@@ -1,47 +1,92 @@
 # nebius_llm.py
+import asyncio
 import os
-from openai import OpenAI
+import weakref
+from openai import AsyncOpenAI, OpenAI
+from http_transport import get_http_client, get_async_http_client
+from retry import acall_with_retry, call_with_retry
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
-from langchain_core.outputs import ChatGeneration, ChatResult
-from typing import Any, Dict, List, Optional
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables.config import ensure_config
+from pydantic import PrivateAttr
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+NEBIUS_BASE_URL = "https://api.studio.nebius.com/v1/"
 
 class ChatNebius(BaseChatModel):
     model_name: str
     nebius_api_key: Optional[str] = None
+    base_url: str = NEBIUS_BASE_URL
     temperature: float = 0.7
     max_tokens: int = 512
     top_p: float = 0.95
-    client: Any = None   
-    
+    # Requests batch/abatch send at the same time unless the call sets max_concurrency
+    batch_concurrency: int = 8
+    client: Any = None
+    _async_clients: Any = PrivateAttr(default_factory=weakref.WeakKeyDictionary)
+
     def __init__(
         self,
         model: str,
         nebius_api_key: Optional[str] = None,
-        temperature: float = 0.7, 
+        temperature: float = 0.7,
         max_tokens: int = 512,
         top_p: float = 0.95,
+        base_url: Optional[str] = None,
         **kwargs
     ):
         super().__init__(
-            model_name=model, 
+            model_name=model,
             nebius_api_key=nebius_api_key,
+            base_url=base_url or os.environ.get("NEBIUS_BASE_URL", NEBIUS_BASE_URL),
             temperature=temperature,
             max_tokens=max_tokens,
             top_p=top_p,
             **kwargs
         )
-        # Initialize the client here
+        # Initialize the client here; it sends requests over the shared connection pool.
+        # The SDK's own retries are off, calls go through the shared retry layer instead.
         self.client = OpenAI(
-            base_url="https://api.studio.nebius.com/v1/",
-            api_key=self.nebius_api_key or os.environ.get("NEBIUS_API_KEY")
+            base_url=self.base_url,
+            api_key=self._api_key(),
+            http_client=get_http_client(),
+            max_retries=0
         )
-    
+
     @property
     def _llm_type(self) -> str:
         return "nebius"
-    
-    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[Any] = None, **kwargs) -> ChatResult:
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        # Part of the LLM cache key, so cached responses are only reused for the same settings
+        return {
+            "model_name": self.model_name,
+            "base_url": self.base_url,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+        }
+
+    def _api_key(self):
+        return self.nebius_api_key or os.environ.get("NEBIUS_API_KEY")
+
+    def _async_client(self) -> AsyncOpenAI:
+        """AsyncOpenAI client of the running event loop, on that loop's pooled transport"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                base_url=self.base_url,
+                api_key=self._api_key(),
+                http_client=get_async_http_client(),
+                max_retries=0
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def _request(self, messages: List[BaseMessage], stop: Optional[List[str]], **kwargs) -> Dict[str, Any]:
         message_dicts = []
         for message in messages:
             if isinstance(message, SystemMessage):
@@ -52,20 +97,86 @@ class ChatNebius(BaseChatModel):
                 message_dicts.append({"role": "assistant", "content": message.content})
             else:
                 message_dicts.append({"role": "user", "content": str(message.content)})
-        
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            max_tokens=self.max_tokens,
-            temperature=self.temperature,
-            top_p=self.top_p,
-            messages=message_dicts,
+
+        request = {
+            "model": self.model_name,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "messages": message_dicts,
             **kwargs
-        )
-        
-        ai_message = AIMessage(content=response.choices[0].message.content)
+        }
+        if stop:
+            request["stop"] = stop
+        return request
+
+    @staticmethod
+    def _chat_result(response) -> ChatResult:
+        usage = getattr(response, "usage", None)
+        usage_metadata = {
+            "input_tokens": usage.prompt_tokens,
+            "output_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens,
+        } if usage else None
+        ai_message = AIMessage(content=response.choices[0].message.content, usage_metadata=usage_metadata)
         generation = ChatGeneration(message=ai_message)
         return ChatResult(generations=[generation])
-        
-    def invoke(self, messages: List[BaseMessage], **kwargs) -> AIMessage:
-        result = self._generate(messages, **kwargs)
-        return result.generations[0].message
\ No newline at end of file
+
+    @staticmethod
+    def _chunk(chunk) -> Optional[ChatGenerationChunk]:
+        if not chunk.choices:
+            return None
+        choice = chunk.choices[0]
+        generation_info = {"finish_reason": choice.finish_reason} if choice.finish_reason else None
+        return ChatGenerationChunk(
+            message=AIMessageChunk(content=choice.delta.content or ""),
+            generation_info=generation_info
+        )
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[Any] = None, **kwargs) -> ChatResult:
+        response = call_with_retry("nebius", self.client.chat.completions.create, **self._request(messages, stop, **kwargs))
+        return self._chat_result(response)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[Any] = None, **kwargs) -> ChatResult:
+        response = await acall_with_retry("nebius", self._async_client().chat.completions.create, **self._request(messages, stop, **kwargs))
+        return self._chat_result(response)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[Any] = None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        # Only opening the stream is retried; tokens already yielded cannot be taken back
+        stream = call_with_retry("nebius", self.client.chat.completions.create, stream=True, **self._request(messages, stop, **kwargs))
+        with stream:
+            for chunk in stream:
+                generation_chunk = self._chunk(chunk)
+                if generation_chunk is None:
+                    continue
+                if run_manager:
+                    run_manager.on_llm_new_token(generation_chunk.text, chunk=generation_chunk)
+                yield generation_chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[Any] = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        stream = await acall_with_retry("nebius", self._async_client().chat.completions.create, stream=True, **self._request(messages, stop, **kwargs))
+        async with stream:
+            async for chunk in stream:
+                generation_chunk = self._chunk(chunk)
+                if generation_chunk is None:
+                    continue
+                if run_manager:
+                    await run_manager.on_llm_new_token(generation_chunk.text, chunk=generation_chunk)
+                yield generation_chunk
+
+    def _batch_config(self, config):
+        """Apply batch_concurrency to every config of a batch that does not set max_concurrency"""
+        if isinstance(config, list):
+            return [self._batch_config(item) for item in config]
+        config = ensure_config(config)
+        if config.get("max_concurrency") is None:
+            config["max_concurrency"] = self.batch_concurrency
+        return config
+
+    def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        """Send the requests concurrently on threads, at most batch_concurrency at a time"""
+        return super().batch(inputs, self._batch_config(config), return_exceptions=return_exceptions, **kwargs)
+
+    async def abatch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        """Send the requests concurrently on the event loop, at most batch_concurrency at a time"""
+        return await super().abatch(inputs, self._batch_config(config), return_exceptions=return_exceptions, **kwargs)
@@ -0,0 +1,132 @@
+import re
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def word_shingles(text, n=3):
+    """Return the set of lowercase word n-grams of text.
+
+    Texts shorter than n words yield a single shingle of all their words.
+    """
+    words = WORD_PATTERN.findall((text or "").lower())
+    if len(words) < n:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+# Share of new n-grams below which a page at an unseen URL counts as a mirror of a known page
+MIRROR_NOVELTY = 0.5
+
+
+def shingle_hashes(text, n=3):
+    """Hashes of the word n-grams of text; a compact stand-in for word_shingles within one process."""
+    return frozenset(map(hash, word_shingles(text, n)))
+
+
+def shingle_novelty(source_shingles, seen_urls, known_shingles):
+    """Score sources given as their URL and word n-grams against what a run already has.
+
+    The score averages the share of new URLs and the share of new n-grams. A page
+    at an unseen URL whose n-grams are mostly known is a mirror and does not count
+    as a new URL, so re-fetched pages and mirrors of known pages both score close
+    to 0. The sources have to be cut the same way as the known text, otherwise the
+    part of a long page that was cut off before looks new.
+
+    Args:
+        source_shingles (dict): Word n-grams of each new source by URL
+        seen_urls (list): URLs gathered before
+        known_shingles (set): Word n-grams of the text the run already has
+
+    Returns:
+        float: Novelty between 0 (nothing new) and 1 (entirely new)
+    """
+    if not source_shingles:
+        return 0.0
+    seen_urls = set(seen_urls)
+    new_urls = 0
+    for url, shingles in source_shingles.items():
+        if url in seen_urls:
+            continue
+        if shingles and len(shingles - known_shingles) < MIRROR_NOVELTY * len(shingles):
+            continue
+        new_urls += 1
+
+    new_shingles = set().union(*source_shingles.values())
+    content = len(new_shingles - known_shingles) / len(new_shingles) if new_shingles else 0.0
+    return round(0.5 * new_urls / len(source_shingles) + 0.5 * content, 3)
+
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from how in into is it of on or the to versus vs what when where which who why with".split()
+)
+
+
+def _stem(word):
+    # Plural folding is enough for queries that differ in wording only
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def query_terms(query):
+    """Lowercase, plural-folded words of a search query without stop words."""
+    words = [_stem(word) for word in WORD_PATTERN.findall((query or "").lower())]
+    terms = frozenset(word for word in words if word not in STOP_WORDS)
+    return terms or frozenset(words)
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class QueryHistory:
+    """Near-duplicate index over the search queries of a research run.
+
+    Queries are compared by the Jaccard similarity of their term sets. An inverted
+    index from term to queries limits each lookup to the queries sharing a term.
+
+    Args:
+        queries (list): Queries searched so far
+        threshold (float): Similarity at or above which two queries count as duplicates
+    """
+
+    def __init__(self, queries=(), threshold=0.7):
+        self.threshold = threshold
+        self._queries = []
+        self._index = {}
+        for query in queries:
+            self.add(query)
+
+    def __len__(self):
+        return len(self._queries)
+
+    def add(self, query):
+        terms = query_terms(query)
+        position = len(self._queries)
+        self._queries.append((query, terms))
+        for term in terms:
+            self._index.setdefault(term, []).append(position)
+
+    def find_duplicate(self, query):
+        """Return the earlier query query nearly repeats, or None."""
+        terms = query_terms(query)
+        candidates = {position for term in terms for position in self._index.get(term, ())}
+        for position in sorted(candidates):
+            earlier, earlier_terms = self._queries[position]
+            if jaccard(terms, earlier_terms) >= self.threshold:
+                return earlier
+        return None
+
+    def filter_new(self, queries):
+        """Return the queries that repeat neither the history nor each other, and add them."""
+        new_queries = []
+        for query in queries:
+            duplicate = self.find_duplicate(query)
+            if duplicate is None:
+                self.add(query)
+                new_queries.append(query)
+            else:
+                print(f"Skipping search query {query!r}, too similar to {duplicate!r}")
+        return new_queries
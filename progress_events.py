@@ -0,0 +1,73 @@
+import json
+import threading
+
+TERMINAL_EVENTS = ("complete", "error")
+
+
+class ResearchEvents:
+    """In-memory event log per research run that server-sent event clients can follow.
+
+    Every event gets a sequence number so a reconnecting EventSource can resume
+    from its Last-Event-ID instead of replaying the whole run. A run's log is
+    kept until it is discarded, which ends the streams still following it.
+    """
+
+    def __init__(self):
+        self._events = {}
+        self._sizes = {}
+        self._cond = threading.Condition()
+
+    def publish(self, research_id, event):
+        with self._cond:
+            events = self._events.setdefault(research_id, [])
+            event = dict(event, seq=len(events))
+            events.append(event)
+            self._sizes[research_id] = self._sizes.get(research_id, 0) + len(json.dumps(event))
+            self._cond.notify_all()
+
+    def size(self, research_id):
+        """Approximate bytes of the run's event log as JSON."""
+        with self._cond:
+            return self._sizes.get(research_id, 0)
+
+    def follow(self, research_id, start=0, timeout=15, alive=None):
+        """Yield the events of a run from sequence number start until it finishes.
+
+        Yields None whenever no event arrived within timeout seconds, so the caller
+        can send a keep-alive to the client. A run that has no log yet can still be
+        dropped before it publishes anything, so while its log is missing the stream
+        ends once alive(research_id) is false.
+        """
+        index = start
+        while True:
+            missing = False
+            with self._cond:
+                events = self._events.get(research_id)
+                if events is None or index >= len(events):
+                    self._cond.wait(timeout)
+                    if research_id not in self._events:
+                        if events is not None:
+                            # Discarded while waiting
+                            return
+                        missing = True
+                    events = self._events.get(research_id, [])
+                pending = events[index:]
+
+            if not pending:
+                # Outside the condition, since the registry sizes logs while holding its own lock
+                if missing and alive is not None and not alive(research_id):
+                    return
+                yield None
+                continue
+
+            for event in pending:
+                yield event
+                index += 1
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+
+    def discard(self, research_id):
+        with self._cond:
+            self._events.pop(research_id, None)
+            self._sizes.pop(research_id, None)
+            self._cond.notify_all()
@@ -0,0 +1,195 @@
+import os
+import threading
+
+
+def ollama_chat_model(configurable, model, json_mode):
+    from langchain_ollama import ChatOllama
+    from llm_cache import llm_cache
+
+    kwargs = {"format": "json"} if json_mode else {}
+    return ChatOllama(model=model, base_url=configurable.ollama_base_url, temperature=0, cache=llm_cache, **kwargs)
+
+
+def groq_chat_model(configurable, model, json_mode):
+    from langchain_groq import ChatGroq
+    from llm_cache import llm_cache
+
+    kwargs = {"model_kwargs": {"response_format": {"type": "json_object"}}} if json_mode else {}
+    return ChatGroq(model=model, temperature=0, groq_api_key=os.getenv("GROQ_API_KEY"), cache=llm_cache, **kwargs)
+
+
+def gemini_chat_model(configurable, model, json_mode):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from llm_cache import llm_cache
+
+    kwargs = {"response_mime_type": "application/json"} if json_mode else {}
+    return ChatGoogleGenerativeAI(model=model, temperature=0, cache=llm_cache, **kwargs)
+
+
+def nebius_chat_model(configurable, model, json_mode):
+    from nebius_llm import ChatNebius
+    from llm_cache import llm_cache
+
+    return ChatNebius(model=model, temperature=0, cache=llm_cache)
+
+
+# Chat model factory and default model per Configuration.llm_provider. Provider SDKs
+# and the LLM cache are imported on first use, so only the providers a process actually
+# serves are loaded, and not before the first research needs them.
+provider_factories = {
+    "ollama": ollama_chat_model,
+    "groq": groq_chat_model,
+    "gemini": gemini_chat_model,
+    "nebius": nebius_chat_model,
+}
+default_models = {
+    "ollama": "gemma3:4b",
+    "groq": "mistral-saba-24b",
+    "gemini": "gemini-1.5-pro",
+    "nebius": "deepseek-ai/DeepSeek-V3-0324",
+}
+chat_models = {}
+chat_models_lock = threading.Lock()
+
+
+def _uses_provider(key, provider):
+    # Hedged and failover wrappers are cheap to rebuild, drop them along with the provider's models
+    return key[0] in (provider, "hedged", "failover")
+
+
+def register_provider(provider, factory, default_model=None):
+    """Build chat models for provider with factory(configurable, model, json_mode) from now on."""
+    with chat_models_lock:
+        provider_factories[provider] = factory
+        if default_model is not None:
+            default_models[provider] = default_model
+        for key in [key for key in chat_models if _uses_provider(key, provider)]:
+            del chat_models[key]
+
+
+def available_providers():
+    return sorted(provider_factories)
+
+
+def allowed_models(provider):
+    """Models a web request may choose for provider: its default model and the ALLOWED_MODELS entries.
+
+    ALLOWED_MODELS is a comma-separated list of provider:model, e.g.
+    "ollama:llama3.2,groq:llama-3.3-70b-versatile". Every model gets its own client
+    and compiled graph that are kept for the life of the process, so requests must
+    not be able to name arbitrary ones.
+    """
+    models = {default_models[provider]} if provider in default_models else set()
+    for entry in os.environ.get("ALLOWED_MODELS", "").split(","):
+        name, _, model = entry.strip().partition(":")
+        if name == provider and model:
+            models.add(model)
+    return models
+
+
+def model_name(configurable):
+    """The configured local_llm, or the provider's default model if none is set."""
+    return configurable.local_llm or default_models.get(configurable.llm_provider)
+
+
+def child_config(run_manager):
+    """Config for a wrapper model's calls to its inner chat models.
+
+    The calls become child runs of the wrapper's run, so callbacks and traces see
+    which provider actually answered.
+    """
+    if run_manager is None:
+        return None
+    from langchain_core.callbacks import CallbackManager
+
+    return {"callbacks": CallbackManager(
+        handlers=run_manager.inheritable_handlers,
+        inheritable_handlers=run_manager.inheritable_handlers,
+        parent_run_id=run_manager.run_id,
+        tags=run_manager.inheritable_tags,
+        inheritable_tags=run_manager.inheritable_tags,
+        metadata=run_manager.inheritable_metadata,
+        inheritable_metadata=run_manager.inheritable_metadata,
+    )}
+
+
+def _chat_model(configurable, provider, model, json_mode):
+    # Callers hold chat_models_lock
+    key = (provider, model, json_mode, configurable.ollama_base_url)
+    chat_model = chat_models.get(key)
+    if chat_model is None:
+        factory = provider_factories.get(provider)
+        if factory is None:
+            raise ValueError(f"No chat model registered for provider {provider}")
+        chat_model = factory(configurable, model, json_mode)
+        chat_models[key] = chat_model
+    return chat_model
+
+
+def fallback_chain(configurable):
+    """(provider, model) pairs of configurable.fallback_providers, other than llm_provider.
+
+    Entries are provider names or provider:model, e.g. "nebius,ollama:gemma3:4b".
+    """
+    chain = []
+    for entry in (configurable.fallback_providers or "").split(","):
+        provider, _, model = entry.strip().partition(":")
+        if provider and provider != configurable.llm_provider:
+            chain.append((provider, model or default_models.get(provider)))
+    return chain
+
+
+def _failover_chat_model(configurable, provider, model, json_mode):
+    # Callers hold chat_models_lock
+    chain = fallback_chain(configurable)
+    if not chain:
+        return _chat_model(configurable, provider, model, json_mode)
+
+    key = ("failover", provider, model, tuple(chain), json_mode, configurable.ollama_base_url)
+    chat_model = chat_models.get(key)
+    if chat_model is None:
+        from circuit_breaker import FailoverChatModel
+
+        chain = [(provider, model)] + chain
+        chat_model = FailoverChatModel(
+            providers=[name for name, _ in chain],
+            models=[_chat_model(configurable, name, chain_model, json_mode) for name, chain_model in chain],
+        )
+        chat_models[key] = chat_model
+    return chat_model
+
+
+def get_chat_model(configurable, json_mode=False):
+    """Return the cached chat model for the provider and model in configurable.
+
+    Clients are created on first use and shared by every request that selects the
+    same provider, model and mode. With fallback_providers the model is wrapped in a
+    FailoverChatModel that moves calls down the chain while a provider fails or its
+    circuit breaker is open. With a hedge_provider other than llm_provider it is
+    wrapped in a HedgedChatModel that sends slow calls to the hedge provider as well.
+    The wrappers are shared too, so their latency history covers every request.
+
+    Raises:
+        ValueError: If no chat model is registered for one of the providers
+    """
+    provider = configurable.llm_provider
+    model = model_name(configurable)
+    hedge_provider = configurable.hedge_provider
+    with chat_models_lock:
+        if hedge_provider is None or hedge_provider == provider:
+            return _failover_chat_model(configurable, provider, model, json_mode)
+
+        hedge_model = configurable.hedge_model or default_models.get(hedge_provider)
+        key = ("hedged", provider, model, tuple(fallback_chain(configurable)), hedge_provider, hedge_model,
+               json_mode, configurable.hedge_percentile, configurable.ollama_base_url)
+        chat_model = chat_models.get(key)
+        if chat_model is None:
+            from hedging import HedgedChatModel
+
+            chat_model = HedgedChatModel(
+                primary=_failover_chat_model(configurable, provider, model, json_mode),
+                secondary=_chat_model(configurable, hedge_provider, hedge_model, json_mode),
+                percentile=configurable.hedge_percentile,
+            )
+            chat_models[key] = chat_model
+        return chat_model
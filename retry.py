@@ -0,0 +1,211 @@
+import asyncio
+import email.utils
+import os
+import random
+import re
+import threading
+import time
+
+import httpx
+
+# Status codes worth retrying: timeouts, throttling and transient server errors
+RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class RetryPolicy:
+    """How often and how long to retry a call.
+
+    Delays grow exponentially from base_delay up to max_delay with full jitter, so
+    clients throttled at the same moment do not retry in lockstep. A Retry-After or
+    rate limit reset header from the server replaces the computed delay. No retry
+    is started that would end after the deadline.
+
+    Args:
+        max_attempts (int): Attempts including the first call
+        base_delay (float): Upper bound of the first backoff delay in seconds
+        max_delay (float): Upper bound of any single backoff delay in seconds
+        deadline (float): Seconds from the first attempt after which no retry is started
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=20.0, deadline=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_attempts=int(os.environ.get("RETRY_MAX_ATTEMPTS", 4)),
+            base_delay=float(os.environ.get("RETRY_BASE_DELAY", 0.5)),
+            max_delay=float(os.environ.get("RETRY_MAX_DELAY", 20)),
+            deadline=float(os.environ.get("RETRY_DEADLINE", 60)),
+        )
+
+    def backoff(self, attempt):
+        """Jittered delay before retry number attempt (1 for the first retry)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class RetryMetrics:
+    """Thread-safe retry counters per call name, e.g. nebius or tavily."""
+
+    FIELDS = ("calls", "retries", "rate_limited", "failures", "deadline_exceeded", "wait_seconds")
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, field, value=1):
+        with self._lock:
+            counters = self._counters.setdefault(name, dict.fromkeys(self.FIELDS, 0))
+            counters[field] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(counters) for name, counters in self._counters.items()}
+
+
+retry_metrics = RetryMetrics()
+default_policy = RetryPolicy.from_env()
+
+
+def status_code(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(exc):
+    """Whether exc is a transient HTTP failure: a retryable status or a connection problem.
+
+    SDK errors such as openai.APIConnectionError wrap the underlying httpx error as
+    their __cause__, so the cause chain is checked as well.
+    """
+    status = status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    cause = exc
+    while cause is not None:
+        if isinstance(cause, (httpx.TransportError, ConnectionError, TimeoutError)):
+            return True
+        cause = cause.__cause__
+    return False
+
+
+def parse_duration(value):
+    """Parse a rate limit reset value: plain seconds or durations like 1m30s and 250ms."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def retry_after_seconds(exc):
+    """Seconds the server asked us to wait, from Retry-After or rate limit headers, or None."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            # Retry-After may also be an HTTP date
+            try:
+                return max(0.0, email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    # OpenAI-compatible APIs (Groq, Nebius) report when the exhausted limit resets
+    if status_code(exc) == 429:
+        resets = [
+            parse_duration(headers[name])
+            for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+            if headers.get(name)
+        ]
+        resets = [reset for reset in resets if reset is not None]
+        if resets:
+            return max(resets)
+    return None
+
+
+def _next_delay(name, exc, attempt, started, policy):
+    """Delay before the next attempt, or None if the call should fail with exc."""
+    if attempt >= policy.max_attempts or not is_retryable(exc):
+        return None
+    if status_code(exc) == 429:
+        retry_metrics.add(name, "rate_limited")
+
+    retry_after = retry_after_seconds(exc)
+    if retry_after is not None:
+        # Up to 20% jitter on top, so throttled callers do not all come back at the same instant
+        delay = min(retry_after, policy.deadline) * random.uniform(1, 1.2)
+    else:
+        delay = policy.backoff(attempt)
+
+    if time.monotonic() - started + delay > policy.deadline:
+        retry_metrics.add(name, "deadline_exceeded")
+        return None
+
+    retry_metrics.add(name, "retries")
+    retry_metrics.add(name, "wait_seconds", delay)
+    print(f"Retrying {name} in {delay:.2f}s after attempt {attempt} failed: {exc}")
+    return delay
+
+
+def call_with_retry(name, fn, *args, policy=None, **kwargs):
+    """Call fn(*args, **kwargs), retrying transient failures according to policy.
+
+    Raises:
+        Exception: The last error once it is not retryable, attempts are used up or
+            the deadline would be exceeded
+    """
+    policy = policy or default_policy
+    retry_metrics.add(name, "calls")
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            delay = _next_delay(name, e, attempt, started, policy)
+            if delay is None:
+                retry_metrics.add(name, "failures")
+                raise
+        time.sleep(delay)
+
+
+async def acall_with_retry(name, fn, *args, policy=None, **kwargs):
+    """Async counterpart of call_with_retry for a coroutine function fn."""
+    policy = policy or default_policy
+    retry_metrics.add(name, "calls")
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            delay = _next_delay(name, e, attempt, started, policy)
+            if delay is None:
+                retry_metrics.add(name, "failures")
+                raise
+        await asyncio.sleep(delay)
@@ -0,0 +1,189 @@
+import collections
+import json
+import threading
+import time
+
+ACTIVE_STATUSES = ("queued", "running")
+# Longest error message kept in a run record
+MAX_ERROR_CHARS = 2000
+
+
+class RunRegistry:
+    """Status and progress of research runs, bounded in count, bytes and age.
+
+    Records only hold status, progress and timestamps. A finished run keeps the
+    key of its result in result_store, e.g. the research cache, and the result is
+    read back on demand, so a record stays a few hundred bytes however long the
+    summary is and runs answered from the same cache entry share it.
+
+    Finished runs are dropped once they are older than ttl seconds, and the oldest
+    finished runs are dropped early while the registry holds more than max_runs
+    records or max_bytes. Queued and running runs are never dropped; the scheduler's
+    queue already bounds them. Every create and update enforces the bounds from a
+    running byte total and the finished runs in the order they finished, so it only
+    touches the runs it drops. Event logs grow without updating their run's record,
+    so a background thread recounts all records every reap_interval seconds.
+    on_remove is called with the research_id of every dropped run.
+
+    Args:
+        result_store (SqliteCache): Store the results of finished runs are read from
+        max_runs (int): Records kept at most; active runs are never evicted
+        max_bytes (int): Approximate bytes of the records and of size_of(research_id)
+        ttl (float): Seconds a finished run is kept after it finished
+        reap_interval (float): Seconds between background reaps
+        size_of (callable): Extra bytes held elsewhere for a run, e.g. its event log
+        on_remove (callable): Called with the research_id of every dropped run
+    """
+
+    def __init__(self, result_store, max_runs=1000, max_bytes=64 * 1024 * 1024, ttl=3600.0,
+                 reap_interval=30.0, size_of=None, on_remove=None):
+        self.result_store = result_store
+        self.max_runs = max_runs
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.reap_interval = reap_interval
+        self.size_of = size_of
+        self.on_remove = on_remove
+        self.reaped = 0
+        self.evicted = 0
+        self._runs = {}
+        # Bytes of every record, their total, and finished runs by the time they finished
+        self._sizes = {}
+        self._bytes = 0
+        self._finished = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def __contains__(self, research_id):
+        with self._lock:
+            return research_id in self._runs
+
+    def _start_reaper(self):
+        # Started with the first run, so importing the app starts no thread
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._reap_forever, name="run-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Warning: Reaping research runs failed: {e}")
+
+    def create(self, research_id, status="queued"):
+        """Add a run unless it is already registered; returns whether it was added."""
+        now = time.time()
+        with self._lock:
+            if research_id in self._runs:
+                return False
+            self._runs[research_id] = {"status": status, "progress": 0, "created_at": now, "updated_at": now}
+            self._track(research_id, now)
+            self._start_reaper()
+            removed = self._evict(now)
+        self._notify_removed(removed)
+        return True
+
+    def update(self, research_id, **fields):
+        """Update a run's record, adding it if it is not registered yet."""
+        now = time.time()
+        with self._lock:
+            record = self._runs.get(research_id)
+            if record is None:
+                # Runs answered from the research cache are never created
+                record = self._runs[research_id] = {"created_at": now}
+                self._start_reaper()
+            record.update(fields, updated_at=now)
+            self._track(research_id, now)
+            removed = self._evict(now)
+        self._notify_removed(removed)
+
+    def complete(self, research_id, result_key):
+        """Mark the run complete with its result stored under result_key in result_store."""
+        self.update(research_id, status="complete", progress=100, result_key=result_key)
+
+    def fail(self, research_id, error):
+        self.update(research_id, status="error", progress=100, error=str(error)[:MAX_ERROR_CHARS])
+
+    def get(self, research_id):
+        """A copy of the run's record, or None if it is unknown or was dropped."""
+        with self._lock:
+            record = self._runs.get(research_id)
+            return dict(record) if record is not None else None
+
+    def result(self, research_id):
+        """The result of a complete run, or None if it is unknown or expired from the result store."""
+        record = self.get(research_id)
+        if record is None or record.get("result_key") is None:
+            return None
+        return self.result_store.get(record["result_key"])
+
+    def _record_bytes(self, research_id, record):
+        size = len(research_id) + len(json.dumps(record))
+        if self.size_of is not None:
+            size += self.size_of(research_id)
+        return size
+
+    def _track(self, research_id, now):
+        # Callers hold self._lock
+        size = self._record_bytes(research_id, self._runs[research_id])
+        self._bytes += size - self._sizes.get(research_id, 0)
+        self._sizes[research_id] = size
+        if self._runs[research_id].get("status") in ACTIVE_STATUSES:
+            self._finished.pop(research_id, None)
+        else:
+            self._finished[research_id] = now
+            self._finished.move_to_end(research_id)
+
+    def _evict(self, now):
+        """Drop expired finished runs, then the oldest finished ones while over budget.
+
+        Callers hold self._lock. Returns the research_ids of the dropped runs.
+        """
+        removed = []
+        while self._finished:
+            research_id, finished_at = next(iter(self._finished.items()))
+            if now - finished_at > self.ttl:
+                self.reaped += 1
+            elif len(self._runs) > self.max_runs or self._bytes > self.max_bytes:
+                self.evicted += 1
+            else:
+                break
+            del self._finished[research_id]
+            del self._runs[research_id]
+            self._bytes -= self._sizes.pop(research_id)
+            removed.append(research_id)
+        return removed
+
+    def _notify_removed(self, removed):
+        if self.on_remove is not None:
+            for research_id in removed:
+                self.on_remove(research_id)
+
+    def reap(self):
+        """Recount the bytes of every run, then drop expired and over-budget finished runs."""
+        now = time.time()
+        with self._lock:
+            self._sizes = {research_id: self._record_bytes(research_id, record)
+                           for research_id, record in self._runs.items()}
+            self._bytes = sum(self._sizes.values())
+            removed = self._evict(now)
+        self._notify_removed(removed)
+        return len(removed)
+
+    def stats(self):
+        with self._lock:
+            statuses = {}
+            for record in self._runs.values():
+                statuses[record.get("status")] = statuses.get(record.get("status"), 0) + 1
+            return {
+                "runs": len(self._runs),
+                "by_status": statuses,
+                "bytes": self._bytes,
+                "max_runs": self.max_runs,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "reaped": self.reaped,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,181 @@
+import asyncio
+import collections
+import math
+import threading
+import time
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the scheduler queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Research queue is full, retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class ResearchScheduler:
+    """Runs research jobs on a fixed pool of worker threads fed by a bounded FIFO queue.
+
+    Worker threads are started lazily on the first submit, so the scheduler can be
+    created at import time in a process that is later forked by gunicorn.
+
+    Args:
+        max_workers (int): Number of research runs executing at the same time
+        max_queue (int): Number of jobs allowed to wait for a free worker
+        default_duration (float): Assumed run time in seconds before any run has finished,
+            used to estimate Retry-After values
+        on_start (callable): Called with the job_id of every job as it leaves the queue,
+            with the scheduler's lock held, so it must not call back into the scheduler
+    """
+
+    def __init__(self, max_workers=4, max_queue=32, default_duration=60.0, on_start=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.on_start = on_start
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._running = 0
+        self._avg_duration = default_duration
+
+    def submit(self, job_id, fn, *args):
+        """Queue fn(*args) and return the job's 1-based queue position.
+
+        Returns None instead if the job was dispatched, i.e. it already started or
+        an idle worker is about to take it.
+
+        Raises:
+            QueueFullError: If max_queue jobs are already waiting
+        """
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                raise QueueFullError(self._retry_after())
+
+            self._queue.append((job_id, fn, args))
+            self._start_workers()
+            self._cond.notify()
+            # Idle workers take the jobs at the head of the queue
+            position = self._position(job_id)
+            idle = self._idle_workers()
+            if position is None or position <= idle:
+                return None
+            return position - idle
+
+    def position(self, job_id):
+        """Return the 1-based queue position of job_id, or None if it is not waiting."""
+        with self._cond:
+            return self._position(job_id)
+
+    def _idle_workers(self):
+        # Callers hold self._cond; every worker not running a job takes the next queued one
+        return len(self._workers) - self._running
+
+    def _started(self, job_id):
+        # Callers hold self._cond
+        self._running += 1
+        if self.on_start is not None:
+            try:
+                self.on_start(job_id)
+            except Exception as e:
+                print(f"Warning: on_start failed for research job {job_id}: {e}")
+
+    def _position(self, job_id):
+        # Callers hold self._cond
+        for index, (queued_id, _, _) in enumerate(self._queue, 1):
+            if queued_id == job_id:
+                return index
+        return None
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.max_workers,
+                "running": self._running,
+                "queued": len(self._queue),
+                "max_queue": self.max_queue,
+                "avg_duration": round(self._avg_duration, 2),
+            }
+
+    def _retry_after(self):
+        """Estimate the seconds until a queue slot frees up.
+
+        With every worker busy, one run finishes on average every
+        avg_duration / max_workers seconds.
+        """
+        return max(1, math.ceil(self._avg_duration / self.max_workers))
+
+    def _start_workers(self):
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job_id, fn, args = self._queue.popleft()
+                self._started(job_id)
+
+            start = time.monotonic()
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Error in research job {job_id}: {e}")
+            finally:
+                duration = time.monotonic() - start
+                with self._cond:
+                    self._running -= 1
+                    self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+
+
+class AsyncResearchScheduler(ResearchScheduler):
+    """Same admission control as ResearchScheduler, but jobs are coroutine functions.
+
+    Instead of one thread per running job, up to max_workers jobs run concurrently
+    as tasks on a single event loop owned by a background thread.
+    """
+
+    def __init__(self, max_workers=64, max_queue=256, default_duration=60.0, on_start=None):
+        super().__init__(max_workers, max_queue, default_duration, on_start)
+        self._loop = None
+
+    def _start_workers(self):
+        if self._loop is None or not self._loop.is_running():
+            self._loop = asyncio.new_event_loop()
+            started = threading.Event()
+            thread = threading.Thread(target=self._run_loop, args=(started,), daemon=True)
+            thread.start()
+            started.wait()
+        self._dispatch()
+
+    def _idle_workers(self):
+        # _dispatch already started every job there was concurrency for
+        return 0
+
+    def _run_loop(self, started):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(started.set)
+        self._loop.run_forever()
+
+    def _dispatch(self):
+        """Start queued jobs while there is spare concurrency. Caller holds the lock."""
+        while self._queue and self._running < self.max_workers:
+            job_id, fn, args = self._queue.popleft()
+            self._started(job_id)
+            asyncio.run_coroutine_threadsafe(self._run_job(job_id, fn, args), self._loop)
+
+    async def _run_job(self, job_id, fn, args):
+        start = time.monotonic()
+        try:
+            await fn(*args)
+        except Exception as e:
+            print(f"Error in research job {job_id}: {e}")
+        finally:
+            duration = time.monotonic() - start
+            with self._cond:
+                self._running -= 1
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+                self._dispatch()
@@ -0,0 +1,51 @@
+import os
+
+from http_transport import get_http_client, get_async_http_client
+from retry import acall_with_retry, call_with_retry
+
+
+class TavilySearchClient:
+    """Minimal client for the Tavily /search endpoint on the shared HTTP transport.
+
+    The tavily SDK opens its own session per client and writes the API key into
+    that session's default headers, so it cannot share a connection pool with the
+    LLM providers. This client sends the key per request instead.
+
+    Throttled (429), failed (5xx) and dropped requests are retried with backoff
+    through the shared retry layer.
+
+    Args:
+        api_key (str): Tavily API key, defaults to the TAVILY_API_KEY environment variable
+        base_url (str): Tavily API base URL
+    """
+
+    def __init__(self, api_key=None, base_url="https://api.tavily.com"):
+        self.api_key = api_key or os.environ.get("TAVILY_API_KEY")
+        self.base_url = base_url.rstrip("/")
+
+    def _request(self, query, max_results, include_raw_content):
+        headers = {"Content-Type": "application/json", "X-Client-Source": "tavily-python"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        payload = {
+            "query": query,
+            "max_results": max_results,
+            "include_raw_content": include_raw_content,
+        }
+        return f"{self.base_url}/search", headers, payload
+
+    def _post(self, url, headers, payload):
+        response = get_http_client().post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def _apost(self, url, headers, payload):
+        response = await get_async_http_client().post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    def search(self, query, max_results=3, include_raw_content=False):
+        return call_with_retry("tavily", self._post, *self._request(query, max_results, include_raw_content))
+
+    async def asearch(self, query, max_results=3, include_raw_content=False):
+        return await acall_with_retry("tavily", self._apost, *self._request(query, max_results, include_raw_content))
@@ -22,6 +22,9 @@ document.addEventListener('DOMContentLoaded', function() {
     progressBarContainer.appendChild(progressBar);
     progressBarContainer.appendChild(progressText);
     loadingElement.appendChild(progressBarContainer);
+    
+    const loadingMessage = loadingElement.querySelector('p');
+    const defaultLoadingMessage = loadingMessage.textContent;
 
     // Hide results section initially
     resultsSection.style.display = 'none';
@@ -30,6 +33,7 @@ document.addEventListener('DOMContentLoaded', function() {
         e.preventDefault();
         
         const researchTopic = document.getElementById('research-topic').value.trim();
+        const llmProvider = document.getElementById('llm-provider').value;
         
         if (!researchTopic) {
             alert('Please enter a research topic');
@@ -55,19 +59,24 @@ document.addEventListener('DOMContentLoaded', function() {
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({ research_topic: researchTopic }),
+                body: JSON.stringify({ research_topic: researchTopic, llm_provider: llmProvider }),
             });
             
             const startData = await startResponse.json();
             
+            if (startResponse.status === 429) {
+                throw new Error(`The server is busy. Please try again in ${startData.retry_after} seconds.`);
+            }
+            
             if (!startResponse.ok) {
                 throw new Error(startData.error || 'Error starting research');
             }
             
             const researchId = startData.research_id;
             
-            // Poll for status updates
-            await pollResearchStatus(researchId);
+            // Follow progress events until the research finishes
+            const summary = await followResearch(researchId);
+            displayResults(summary);
             
         } catch (error) {
             console.error('Error:', error);
@@ -79,65 +88,76 @@ document.addEventListener('DOMContentLoaded', function() {
             `;
             resultsContainer.style.display = 'block';
             loadingElement.style.display = 'none';
+        } finally {
+            loadingMessage.textContent = defaultLoadingMessage;
         }
     });
     
-    async function pollResearchStatus(researchId) {
-        let complete = false;
-        let attempts = 0;
-        const maxAttempts = 60; // 5 minutes with 5s interval
+    const nodeLabels = {
+        generate_query: 'Generating search query',
+        web_research: 'Searching the web',
+        summarize_sources: 'Summarizing sources',
+        reflect_on_summary: 'Looking for knowledge gaps',
+        finalize_summary: 'Writing the final summary'
+    };
+    
+    function updateProgress(event) {
+        const progress = event.progress;
+        if (progress !== undefined) {
+            progressBar.style.width = `${progress}%`;
+            progressText.textContent = `${progress}%`;
+        }
         
-        while (!complete && attempts < maxAttempts) {
-            try {
-                const statusResponse = await fetch(`/research/status/${researchId}`);
-                const statusData = await statusResponse.json();
-                
-                if (!statusResponse.ok) {
-                    throw new Error(statusData.error || 'Error checking research status');
-                }
-                
-                // Update progress bar
-                const progress = statusData.progress || 0;
-                progressBar.style.width = `${progress}%`;
-                progressText.textContent = `${progress}%`;
-                
-                if (statusData.status === 'complete') {
-                    // Process and display the results
-                    displayResults(statusData.summary);
-                    complete = true;
-                    break;
-                } else if (statusData.status === 'error') {
-                    throw new Error(statusData.error || 'Error during research');
-                }
-                
-                // Wait before polling again
-                await new Promise(resolve => setTimeout(resolve, 2000));
-                attempts++;
-                
-            } catch (error) {
-                console.error('Error polling status:', error);
-                summaryContent.innerHTML = `
-                    <div class="error-message">
-                        <p><strong>Error:</strong> ${error.message}</p>
-                        <p>Please try again with a different topic or check your connection.</p>
-                    </div>
-                `;
-                resultsContainer.style.display = 'block';
-                loadingElement.style.display = 'none';
-                return;
-            }
+        if (event.type === 'queued') {
+            progressText.textContent = `Queued (position ${event.queue_position})`;
+            loadingMessage.textContent = 'Waiting for a free research worker...';
+        } else if (event.type === 'node_started') {
+            const label = nodeLabels[event.node] || event.node;
+            // web_research increments the loop count, so it starts one loop ahead
+            const loop = event.research_loop_count + (event.node === 'web_research' ? 1 : 0);
+            const prefix = loop > 0 && event.node !== 'finalize_summary' ? `Loop ${loop}: ` : '';
+            const queries = event.queries || (event.query ? [event.query] : []);
+            loadingMessage.textContent = queries.length
+                ? `${prefix}${label} for ${queries.map(query => `"${query}"`).join(', ')}...`
+                : `${prefix}${label}...`;
         }
+    }
+    
+    async function fetchSummary(researchId) {
+        const response = await fetch(`/research/status/${researchId}`);
+        const data = await response.json();
         
-        if (!complete) {
-            summaryContent.innerHTML = `
-                <div class="error-message">
-                    <p><strong>Error:</strong> Research is taking longer than expected.</p>
-                    <p>Please try again with a more specific topic.</p>
-                </div>
-            `;
-            resultsContainer.style.display = 'block';
-            loadingElement.style.display = 'none';
+        if (!response.ok || data.status !== 'complete') {
+            throw new Error(data.error || 'Error fetching research results');
         }
+        return data.summary;
+    }
+    
+    function followResearch(researchId) {
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(`/research/stream/${researchId}`);
+            
+            source.onmessage = function(message) {
+                const event = JSON.parse(message.data);
+                updateProgress(event);
+                
+                if (event.type === 'complete') {
+                    source.close();
+                    resolve(fetchSummary(researchId));
+                } else if (event.type === 'error') {
+                    source.close();
+                    reject(new Error(event.error || 'Error during research'));
+                }
+            };
+            
+            // EventSource reconnects on its own after network errors; only give up
+            // once the browser has closed the connection for good.
+            source.onerror = function() {
+                if (source.readyState === EventSource.CLOSED) {
+                    reject(new Error('Lost connection to the research server'));
+                }
+            };
+        });
     }
     
     function displayResults(summary) {
@@ -0,0 +1,145 @@
+import math
+import os
+import threading
+from concurrent.futures import Future, TimeoutError
+
+
+class HeuristicTokenizer:
+    """Approximates tokens as a fixed number of characters per token.
+
+    This is what the pipeline used everywhere before; it is kept as the fallback
+    when no real tokenizer is available for a provider.
+    """
+
+    name = "heuristic"
+
+    def __init__(self, chars_per_token=4):
+        self.chars_per_token = chars_per_token
+
+    def count(self, text):
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def truncate(self, text, max_tokens):
+        return text[:max_tokens * self.chars_per_token]
+
+
+class TiktokenTokenizer:
+    """Counts and truncates with a tiktoken BPE encoding."""
+
+    def __init__(self, encoding_name):
+        import tiktoken
+
+        self.name = f"tiktoken:{encoding_name}"
+        self.encoding = tiktoken.get_encoding(encoding_name)
+
+    def count(self, text):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text, max_tokens):
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens])
+
+
+def tiktoken_factory(encoding_name):
+    return lambda: TiktokenTokenizer(encoding_name)
+
+
+# Tokenizer factory per LLM provider. None of the hosted models ship a tokenizer we
+# can load without extra downloads, so the OpenAI BPE encodings serve as a close
+# approximation; register an exact tokenizer with register_tokenizer where one exists.
+tokenizer_factories = {
+    "groq": tiktoken_factory("cl100k_base"),
+    "nebius": tiktoken_factory("cl100k_base"),
+    "gemini": tiktoken_factory("o200k_base"),
+    "ollama": tiktoken_factory("cl100k_base"),
+    "lmstudio": tiktoken_factory("cl100k_base"),
+}
+tokenizers = {}
+tokenizers_lock = threading.Lock()
+# Tokenizers being loaded by provider. tiktoken downloads its encoding on first use,
+# which can hang without network access, so loading happens on its own thread and
+# callers wait for it at most TOKENIZER_LOAD_TIMEOUT seconds
+tokenizer_loads = {}
+TOKENIZER_LOAD_TIMEOUT = float(os.environ.get("TOKENIZER_LOAD_TIMEOUT", 10))
+
+
+def register_tokenizer(provider, factory):
+    """Use factory() to build the tokenizer for provider from now on."""
+    with tokenizers_lock:
+        tokenizer_factories[provider] = factory
+        tokenizers.pop(provider, None)
+        tokenizer_loads.pop(provider, None)
+
+
+def _load_tokenizer(provider, factory, future):
+    try:
+        future.set_result(factory())
+    except Exception as e:
+        print(f"Warning: Falling back to heuristic token counts for {provider}: {e}")
+        future.set_result(None)
+
+
+def get_tokenizer(provider=None):
+    """Return the cached tokenizer for provider.
+
+    Falls back to HeuristicTokenizer when the provider is unknown or its tokenizer
+    cannot be loaded within TOKENIZER_LOAD_TIMEOUT seconds, e.g. tiktoken is not
+    installed or its encoding files cannot be downloaded. The lock is not held
+    while a tokenizer loads, so other providers are not held up.
+    """
+    with tokenizers_lock:
+        if provider in tokenizers:
+            return tokenizers[provider]
+        factory = tokenizer_factories.get(provider)
+        if factory is None:
+            tokenizers[provider] = HeuristicTokenizer()
+            return tokenizers[provider]
+        future = tokenizer_loads.get(provider)
+        if future is None:
+            future = tokenizer_loads[provider] = Future()
+            threading.Thread(target=_load_tokenizer, args=(provider, factory, future),
+                             name=f"tokenizer-{provider}", daemon=True).start()
+
+    try:
+        tokenizer = future.result(timeout=TOKENIZER_LOAD_TIMEOUT)
+    except TimeoutError:
+        print(f"Warning: Loading the tokenizer for {provider} takes over {TOKENIZER_LOAD_TIMEOUT}s, "
+              f"falling back to heuristic token counts")
+        tokenizer = None
+
+    with tokenizers_lock:
+        if tokenizer_loads.get(provider) is future:
+            del tokenizer_loads[provider]
+        # The first result sticks, so token counts stay consistent for the process
+        return tokenizers.setdefault(provider, tokenizer or HeuristicTokenizer())
+
+
+def allocate_token_budget(token_counts, budget):
+    """Split budget across items so short items keep everything and long ones share the rest.
+
+    Items are served shortest first; each gets at most an equal share of what is
+    left, so budget unused by short sources flows to the longer ones.
+
+    Returns:
+        list: Tokens allotted to each item, in input order
+    """
+    if sum(token_counts) <= budget:
+        return list(token_counts)
+    allocation = [0] * len(token_counts)
+    remaining = budget
+    order = sorted(range(len(token_counts)), key=token_counts.__getitem__)
+    for position, index in enumerate(order):
+        left = len(order) - position
+        share = remaining // left
+        if token_counts[index] > share:
+            # This and every longer item take a full share; dealt out one by one the
+            # shares would come out the same, the last remaining % left one token larger
+            extra = remaining % left
+            for offset, index in enumerate(order[position:]):
+                allocation[index] = share + (offset >= left - extra)
+            return allocation
+        allocation[index] = token_counts[index]
+        remaining -= allocation[index]
+    return allocation
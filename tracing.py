@@ -0,0 +1,335 @@
+import collections
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import uuid
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# OpenTelemetry span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+SERVICE_NAME = "deep-research"
+
+
+def _message_chars(messages):
+    return sum(len(message.content) if isinstance(message.content, str) else len(str(message.content))
+               for batch in messages for message in batch)
+
+
+class RunTracer(BaseCallbackHandler):
+    """Callback handler that records the spans of one research run.
+
+    The graph run is the root span, each node run a child of it, and the LLM calls
+    and web searches of a node are children of the node. Runnables the graph
+    starts internally are not recorded; their children are attached to the closest
+    recorded ancestor. Once the root span ends the trace is handed to on_finish.
+
+    Args:
+        research_id (str): Id the trace is stored and looked up under
+        on_finish (callable): Called with the finished tracer
+    """
+
+    run_inline = True
+
+    def __init__(self, research_id, on_finish=None):
+        self.research_id = research_id
+        self.trace_id = uuid.uuid4().hex
+        self.on_finish = on_finish
+        self.spans = {}
+        self._parents = {}
+        self._lock = threading.Lock()
+
+    def _parent_span(self, parent_run_id):
+        # Skips the runs that have no span of their own
+        while parent_run_id is not None and parent_run_id not in self.spans:
+            parent_run_id = self._parents.get(parent_run_id)
+        return parent_run_id
+
+    def _start(self, run_id, parent_run_id, name, kind, attributes):
+        with self._lock:
+            parent = self._parent_span(parent_run_id)
+            if parent is None and self.spans:
+                # A run of the same callbacks outside the traced graph run
+                return
+            self.spans[run_id] = {
+                "span_id": uuid.uuid4().hex[:16],
+                "parent": parent,
+                "name": name,
+                "kind": kind,
+                "start": time.time_ns(),
+                "end": None,
+                "attributes": attributes,
+                "status": STATUS_OK,
+                "status_message": "",
+            }
+
+    def _skip(self, run_id, parent_run_id):
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+
+    def _end(self, run_id, error=None, **attributes):
+        with self._lock:
+            span = self.spans.get(run_id)
+            if span is None:
+                self._parents.pop(run_id, None)
+                return
+            span["end"] = time.time_ns()
+            span["attributes"].update(attributes)
+            if error is not None:
+                if type(error).__name__ == "CancelledError":
+                    span["attributes"]["cancelled"] = True
+                else:
+                    span["status"] = STATUS_ERROR
+                    span["status_message"] = str(error)
+            finished = span["parent"] is None
+        if finished and self.on_finish is not None:
+            self.on_finish(self)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        name = kwargs.get("name") or ""
+        node = (metadata or {}).get("langgraph_node")
+        with self._lock:
+            # A node runs a nested runnable of its own name, which gets no span of its own
+            parent_name = self.spans.get(self._parent_span(parent_run_id), {}).get("name")
+        if parent_run_id is None:
+            self._start(run_id, None, "research", SPAN_KIND_INTERNAL, {"research.id": self.research_id})
+        elif node is not None and name == node and parent_name != node:
+            self._start(run_id, parent_run_id, node, SPAN_KIND_INTERNAL, {
+                "langgraph.node": node,
+                "langgraph.step": (metadata or {}).get("langgraph_step"),
+            })
+        else:
+            self._skip(run_id, parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None,
+                            invocation_params=None, **kwargs):
+        metadata = metadata or {}
+        invocation_params = invocation_params or {}
+        provider = metadata.get("ls_provider") or invocation_params.get("_type") or ""
+        model = (metadata.get("ls_model_name") or invocation_params.get("model")
+                 or invocation_params.get("model_name") or "")
+        self._start(run_id, parent_run_id, f"chat {provider}", SPAN_KIND_CLIENT, {
+            "gen_ai.system": provider,
+            "gen_ai.request.model": model,
+            "llm.type": invocation_params.get("_type"),
+            "llm.prompt_messages": sum(len(batch) for batch in messages),
+            "llm.prompt_chars": _message_chars(messages),
+        })
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        attributes = {}
+        generations = response.generations[0] if response.generations else []
+        if generations:
+            attributes["llm.completion_chars"] = len(generations[0].text)
+            usage = getattr(getattr(generations[0], "message", None), "usage_metadata", None)
+            if usage:
+                attributes["gen_ai.usage.input_tokens"] = usage.get("input_tokens")
+                attributes["gen_ai.usage.output_tokens"] = usage.get("output_tokens")
+        self._end(run_id, **attributes)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self._start(run_id, parent_run_id, name, SPAN_KIND_CLIENT, {"search.query": input_str})
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        attributes = {}
+        if isinstance(output, dict):
+            results = output.get("results") or []
+            attributes["search.results"] = len(results)
+            attributes["search.raw_content_bytes"] = sum(
+                len((result.get("raw_content") or "").encode("utf-8")) for result in results)
+            if output.get("error"):
+                attributes["search.error"] = output["error"]
+        self._end(run_id, **attributes)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def finished_spans(self):
+        """Spans in start order; spans still open are ended now."""
+        now = time.time_ns()
+        with self._lock:
+            spans = [dict(span, end=span["end"] or now) for span in self.spans.values()]
+            span_ids = {run_id: span["span_id"] for run_id, span in self.spans.items()}
+        for span in spans:
+            span["parent_span_id"] = span_ids.get(span.pop("parent"), "")
+        return sorted(spans, key=lambda span: span["start"])
+
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes):
+    return [{"key": key, "value": _attribute_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def otlp_json(trace_id, spans):
+    """The spans as an OTLP/JSON ExportTraceServiceRequest."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": _attributes({"service.name": SERVICE_NAME})},
+        "scopeSpans": [{
+            "scope": {"name": "research_pipeline"},
+            "spans": [{
+                "traceId": trace_id,
+                "spanId": span["span_id"],
+                "parentSpanId": span["parent_span_id"],
+                "name": span["name"],
+                "kind": span["kind"],
+                "startTimeUnixNano": str(span["start"]),
+                "endTimeUnixNano": str(span["end"]),
+                "attributes": _attributes(span["attributes"]),
+                "status": {"code": span["status"], "message": span["status_message"]},
+            } for span in spans],
+        }],
+    }]}
+
+
+def _attribute_dict(attributes):
+    values = {}
+    for item in attributes:
+        (kind, value), = item["value"].items()
+        values[item["key"]] = int(value) if kind == "intValue" else value
+    return values
+
+
+def waterfall(trace):
+    """Spans of an OTLP/JSON trace with their offset and duration in milliseconds and tree depth."""
+    spans = [span for resource in trace["resourceSpans"] for scope in resource["scopeSpans"] for span in scope["spans"]]
+    if not spans:
+        return []
+    start = min(int(span["startTimeUnixNano"]) for span in spans)
+    parents = {span["spanId"]: span["parentSpanId"] for span in spans}
+
+    def depth(span_id):
+        level = 0
+        while parents.get(span_id):
+            span_id = parents[span_id]
+            level += 1
+        return level
+
+    return [{
+        "span_id": span["spanId"],
+        "parent_span_id": span["parentSpanId"] or None,
+        "name": span["name"],
+        "depth": depth(span["spanId"]),
+        "offset_ms": round((int(span["startTimeUnixNano"]) - start) / 1e6, 3),
+        "duration_ms": round((int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6, 3),
+        "status": "error" if span["status"]["code"] == STATUS_ERROR else "ok",
+        "error": span["status"]["message"] or None,
+        "attributes": _attribute_dict(span["attributes"]),
+    } for span in sorted(spans, key=lambda span: int(span["startTimeUnixNano"]))]
+
+
+class TraceStore:
+    """Writes finished traces to a rotating JSON lines file and keeps the latest in memory.
+
+    Every line holds one run: its research_id and the trace as an OTLP/JSON
+    ExportTraceServiceRequest, which collectors and viewers that read OTLP
+    files can load.
+
+    Args:
+        path (str): Trace file; rotated to path.1, path.2, ... once it reaches max_bytes
+        max_bytes (int): Size at which the file is rotated
+        backups (int): Rotated files to keep
+        recent (int): Traces kept in memory for lookups by research_id
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backups=5, recent=256):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._recent = collections.OrderedDict()
+        self._max_recent = recent
+        self._logger = None
+        self._lock = threading.Lock()
+
+    def _file_logger(self):
+        # Opened on the first trace, so a process that never traces creates no file
+        if self._logger is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger(f"{__name__}.{id(self)}")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def tracer(self, research_id):
+        return RunTracer(research_id, on_finish=self.save)
+
+    def save(self, tracer):
+        trace = otlp_json(tracer.trace_id, tracer.finished_spans())
+        with self._lock:
+            self._recent[tracer.research_id] = trace
+            while len(self._recent) > self._max_recent:
+                self._recent.popitem(last=False)
+            logger = self._file_logger()
+        try:
+            logger.info(json.dumps({"research_id": tracer.research_id, "trace": trace}))
+        except Exception as e:
+            print(f"Warning: Failed to write trace of {tracer.research_id}: {e}")
+
+    def get(self, research_id, search_files=True):
+        """The OTLP/JSON trace of research_id from memory or the trace files, or None.
+
+        Reading the files scans them all, so callers should pass search_files=False
+        for research_ids they cannot tell are real.
+        """
+        with self._lock:
+            trace = self._recent.get(research_id)
+        if trace is not None or not search_files:
+            return trace
+        paths = [self.path] + [f"{self.path}.{index}" for index in range(1, self.backups + 1)]
+        needle = json.dumps(research_id)
+        for path in paths:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        if needle in line:
+                            record = json.loads(line)
+                            if record.get("research_id") == research_id:
+                                return record["trace"]
+            except FileNotFoundError:
+                continue
+        return None
+
+
+def create_trace_store():
+    """The process-wide TraceStore, or None if tracing is disabled with RESEARCH_TRACE=0."""
+    if os.environ.get("RESEARCH_TRACE", "1") == "0":
+        return None
+    return TraceStore(
+        os.environ.get("TRACE_PATH", os.path.join("traces", "research.jsonl")),
+        max_bytes=int(os.environ.get("TRACE_MAX_BYTES", 50 * 1024 * 1024)),
+        backups=int(os.environ.get("TRACE_BACKUPS", 5)),
+        recent=int(os.environ.get("TRACE_RECENT", 256)),
+    )
+
+
+trace_store = create_trace_store()